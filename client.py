@@ -298,7 +298,10 @@ if __name__ == "__main__":
             if data['position'] == data['action_position']:
                 position = data['position']
                 action = get_action(data)
-                sendJson(client, {'action': action, 'info': 'action'})
+                reply = {'action': action, 'info': 'action'}
+                if 'request_id' in data:  # 开启行动时限时原样带回
+                    reply['request_id'] = data['request_id']
+                sendJson(client, reply)
         elif data['info'] == 'result':
             if position is not None:
                 win_money = data['players'][position]['win_money']
@@ -313,7 +316,10 @@ if __name__ == "__main__":
                 print(f"公共牌: {public_card}")
                 print(f"当前总筹码: {data['players'][position]['money_left']}")
                 print("=" * 30)
-            sendJson(client, {'info': 'ready', 'status': 'start'})
+            reply = {'info': 'ready', 'status': 'start'}
+            if 'request_id' in data:
+                reply['request_id'] = data['request_id']
+            sendJson(client, reply)
         else:
             print(data)
             break
@@ -1,7 +1,7 @@
 from poker.core.action import Action, ActionType
-from poker.core.card import Card
+from poker.core.card import Card, CardSet
 from poker.core.history import History
-from poker.core.player import PlayerBase, PlayerStatus, PlayerResult
+from poker.core.player import PlayerBase, PlayerStatus, PlayerSnapshot, PlayerResult
 from poker.core.result import Result
 from poker.core.state import State
 
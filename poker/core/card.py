@@ -1,3 +1,5 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+
 card_ranks = [
     '2', '3', '4', '5', '6', '7',
     '8', '9', 'T', 'J', 'Q', 'K', 'A'
@@ -11,17 +13,51 @@ card_codes = {card: index for index, card in enumerate(all_cards, 1)}
 
 
 class Card:
+    """One of the 52 cards, every card exists once so cards compare and copy by identity"""
+    __slots__ = ('rank', 'suit', 'code', 'bit')
+    _instances: Dict[Tuple[str, str], 'Card'] = {}
+
     rank: str
     suit: str
+    code: int
+    bit: int
+
+    def __new__(cls, rank: str, suit: str):
+        inst = cls._instances.get((rank, suit))
+        if inst is None:
+            assert rank in card_ranks
+            assert suit in card_suits
+            inst = super().__new__(cls)
+            code = card_codes[rank + suit]
+            object.__setattr__(inst, 'rank', rank)
+            object.__setattr__(inst, 'suit', suit)
+            object.__setattr__(inst, 'code', code)
+            object.__setattr__(inst, 'bit', 1 << (code - 1))
+            cls._instances[(rank, suit)] = inst
+        return inst
 
-    def __init__(self, rank: str, suit: str):
-        assert rank in card_ranks
-        assert suit in card_suits
-        self.rank = rank
-        self.suit = suit
+    def __setattr__(self, name, value):
+        raise AttributeError('Card is read-only.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Card is read-only.')
 
     def __eq__(self, other: 'Card'):
-        return self.code == other.code
+        if not isinstance(other, Card):
+            return NotImplemented
+        return self is other or self.code == other.code
+
+    def __hash__(self):
+        return self.code
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Card, (self.rank, self.suit)
 
     def __str__(self):
         return self.rank_suit
@@ -29,10 +65,6 @@ class Card:
     def __repr__(self):
         return self.rank_suit
 
-    @property
-    def code(self):
-        return card_codes[self.rank + self.suit]
-
     @property
     def rank_suit(self):
         return self.rank + self.suit
@@ -53,5 +85,87 @@ class Card:
         suit = suit_rank[0].lower()
         return Card(rank, suit)
 
+    @staticmethod
+    def from_code(code: int) -> 'Card':
+        return deck[code - 1]
+
     def json(self) -> str:
         return self.rank_suit
+
+
+deck = [Card(card[0], card[1]) for card in all_cards]
+
+
+class CardSet:
+    """Immutable set of cards stored as a 52-bit mask, bit `code - 1` stands for the card with that code"""
+    __slots__ = ('mask',)
+
+    mask: int
+
+    def __init__(self, mask: int = 0):
+        self.mask = mask
+
+    @classmethod
+    def of(cls, cards: Iterable[Card]) -> 'CardSet':
+        mask = 0
+        for card in cards:
+            mask |= card.bit
+        return cls(mask)
+
+    @classmethod
+    def from_codes(cls, codes: Iterable[int]) -> 'CardSet':
+        mask = 0
+        for code in codes:
+            mask |= 1 << (code - 1)
+        return cls(mask)
+
+    def __contains__(self, card: Card) -> bool:
+        return self.mask & card.bit != 0
+
+    def __iter__(self) -> Iterator[Card]:
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield deck[low.bit_length() - 1]
+            mask ^= low
+
+    def __len__(self) -> int:
+        return bin(self.mask).count('1')
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __or__(self, other: 'CardSet') -> 'CardSet':
+        return CardSet(self.mask | other.mask)
+
+    def __and__(self, other: 'CardSet') -> 'CardSet':
+        return CardSet(self.mask & other.mask)
+
+    def __sub__(self, other: 'CardSet') -> 'CardSet':
+        return CardSet(self.mask & ~other.mask)
+
+    def __eq__(self, other: 'CardSet'):
+        if not isinstance(other, CardSet):
+            return NotImplemented
+        return self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return f'CardSet({" ".join(map(str, self))})'
+
+    def add(self, card: Card) -> 'CardSet':
+        return CardSet(self.mask | card.bit)
+
+    def isdisjoint(self, other: 'CardSet') -> bool:
+        return self.mask & other.mask == 0
+
+    def codes(self) -> List[int]:
+        return [card.code for card in self]
+
+    def json(self) -> List[str]:
+        return [card.json() for card in self]
+
+
+full_deck = CardSet((1 << len(deck)) - 1)
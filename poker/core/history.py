@@ -2,12 +2,30 @@ from poker.core import Action
 
 
 class History:
+    """One recorded action, read-only so that it can be shared between states"""
+    __slots__ = ('position', 'action')
+
     position: int
     action: Action
 
     def __init__(self, position: int, action: Action):
-        self.position = position
-        self.action = action
+        object.__setattr__(self, 'position', position)
+        object.__setattr__(self, 'action', action)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('History is read-only.')
+
+    def __delattr__(self, name):
+        raise AttributeError('History is read-only.')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return History, (self.position, self.action)
 
     def json(self) -> dict:
         return {
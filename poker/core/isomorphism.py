@@ -0,0 +1,189 @@
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import combinations_with_replacement
+from typing import Dict, List, Sequence, Tuple
+
+from poker.core.card import card_ranks, card_suits
+
+NUM_RANK = len(card_ranks)
+NUM_SUIT = len(card_suits)
+
+CountVector = Tuple[int, ...]
+
+
+@lru_cache(maxsize=None)
+def n_choose_k(n: int, k: int) -> int:
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _colex_index(positions: Sequence[int]) -> int:
+    """Index of a strictly increasing sequence in the combinatorial number system"""
+    return sum(n_choose_k(p, i) for i, p in enumerate(positions, 1))
+
+
+def _colex_unindex(index: int, k: int) -> List[int]:
+    positions = []
+    for i in range(k, 0, -1):
+        p = i - 1
+        while n_choose_k(p + 1, i) <= index:
+            p += 1
+        index -= n_choose_k(p, i)
+        positions.append(p)
+    return positions[::-1]
+
+
+class HandIndexer:
+    """
+    Perfect index of hands up to a relabelling of suits, for a fixed number of cards dealt in each round,
+    e.g. `HandIndexer((2, 3))` indexes hole cards with the flop and has 1286792 entries.
+    Cards are codes from `poker.core.card.card_codes`, the order of cards inside a round does not matter.
+    """
+    rounds: Tuple[int, ...]
+    size: int
+
+    def __init__(self, rounds: Sequence[int]):
+        self.rounds = tuple(rounds)
+        vectors = [vector for vector in self._count_vectors(len(self.rounds)) if sum(vector) <= NUM_RANK]
+        vectors.sort(reverse=True)
+
+        # A configuration lists the count vectors of the four suits, sorted, so that suits are interchangeable
+        # exactly when they share a vector.
+        self.configurations: List[Tuple[CountVector, ...]] = []
+        self.positions: Dict[Tuple[CountVector, ...], int] = {}
+        self.offsets: List[int] = []
+        self.size = 0
+        for configuration in combinations_with_replacement(vectors, NUM_SUIT):
+            if tuple(map(sum, zip(*configuration))) != self.rounds:
+                continue
+            self.positions[configuration] = len(self.configurations)
+            self.configurations.append(configuration)
+            self.offsets.append(self.size)
+            self.size += self._configuration_size(configuration)
+
+    def _count_vectors(self, depth: int) -> List[CountVector]:
+        if depth == 0:
+            return [()]
+        return [vector + (count,) for vector in self._count_vectors(depth - 1)
+                for count in range(self.rounds[depth - 1] + 1)]
+
+    @staticmethod
+    def _suit_size(vector: CountVector) -> int:
+        size, used = 1, 0
+        for count in vector:
+            size *= n_choose_k(NUM_RANK - used, count)
+            used += count
+        return size
+
+    @classmethod
+    def _groups(cls, configuration: Tuple[CountVector, ...]) -> List[Tuple[CountVector, int]]:
+        groups = []
+        for vector in configuration:
+            if groups and groups[-1][0] == vector:
+                groups[-1] = (vector, groups[-1][1] + 1)
+            else:
+                groups.append((vector, 1))
+        return groups
+
+    @classmethod
+    def _configuration_size(cls, configuration: Tuple[CountVector, ...]) -> int:
+        size = 1
+        for vector, num_suit in cls._groups(configuration):
+            size *= n_choose_k(cls._suit_size(vector) + num_suit - 1, num_suit)
+        return size
+
+    @staticmethod
+    def _suit_index(rank_sets: List[int], vector: CountVector) -> int:
+        """Index of the rank bitmasks one suit holds in each round"""
+        index, used = 0, 0
+        for rank_set, count in zip(rank_sets, vector):
+            positions = [rank - bin(used & ((1 << rank) - 1)).count('1')
+                         for rank in range(NUM_RANK) if rank_set >> rank & 1]
+            index = index * n_choose_k(NUM_RANK - bin(used).count('1'), count) + _colex_index(positions)
+            used |= rank_set
+        return index
+
+    @staticmethod
+    def _suit_unindex(index: int, vector: CountVector) -> List[int]:
+        bases, used_count = [], 0
+        for count in vector:
+            bases.append(n_choose_k(NUM_RANK - used_count, count))
+            used_count += count
+        digits = []
+        for base in reversed(bases):
+            index, digit = divmod(index, base)
+            digits.append(digit)
+        digits.reverse()
+
+        rank_sets, used = [], 0
+        for digit, count in zip(digits, vector):
+            free = [rank for rank in range(NUM_RANK) if not used >> rank & 1]
+            rank_set = sum(1 << free[position] for position in _colex_unindex(digit, count))
+            rank_sets.append(rank_set)
+            used |= rank_set
+        return rank_sets
+
+    def index(self, cards: Sequence[Sequence[int]]) -> int:
+        """Index of the hand given the card codes dealt in each round"""
+        if tuple(map(len, cards)) != self.rounds:
+            raise ValueError(f'Expected {self.rounds} cards per round, got {tuple(map(len, cards))}.')
+        rank_sets = [[0] * len(self.rounds) for _ in range(NUM_SUIT)]
+        seen = 0
+        for i, round_cards in enumerate(cards):
+            for code in round_cards:
+                if seen >> code & 1:
+                    raise ValueError('Duplicate cards.')
+                seen |= 1 << code
+                rank, suit = divmod(code - 1, NUM_SUIT)
+                rank_sets[suit][i] |= 1 << rank
+        suits = sorted(((tuple(bin(rank_set).count('1') for rank_set in suit_sets), suit_sets)
+                        for suit_sets in rank_sets), key=lambda item: item[0], reverse=True)
+        configuration = tuple(vector for vector, _ in suits)
+        position = self.positions[configuration]
+
+        index, start = 0, 0
+        for vector, num_suit in self._groups(configuration):
+            suit_indices = sorted(self._suit_index(suit_sets, vector) for _, suit_sets in suits[start:start + num_suit])
+            group_index = _colex_index([suit_index + i for i, suit_index in enumerate(suit_indices)])
+            index = index * n_choose_k(self._suit_size(vector) + num_suit - 1, num_suit) + group_index
+            start += num_suit
+        return self.offsets[position] + index
+
+    def unindex(self, index: int) -> List[List[int]]:
+        """Canonical card codes of each round for an index"""
+        if not 0 <= index < self.size:
+            raise ValueError(f'Index {index} out of range.')
+        position = bisect_right(self.offsets, index) - 1
+        configuration = self.configurations[position]
+        index -= self.offsets[position]
+
+        groups = self._groups(configuration)
+        group_indices = []
+        for vector, num_suit in reversed(groups):
+            index, group_index = divmod(index, n_choose_k(self._suit_size(vector) + num_suit - 1, num_suit))
+            group_indices.append(group_index)
+        group_indices.reverse()
+
+        cards: List[List[int]] = [[] for _ in self.rounds]
+        suit = 0
+        for (vector, num_suit), group_index in zip(groups, group_indices):
+            positions = _colex_unindex(group_index, num_suit)
+            for i, position in enumerate(positions):
+                for round_cards, rank_set in zip(cards, self._suit_unindex(position - i, vector)):
+                    round_cards.extend(rank * NUM_SUIT + suit + 1 for rank in range(NUM_RANK) if rank_set >> rank & 1)
+                suit += 1
+        return [sorted(round_cards) for round_cards in cards]
+
+    def canonicalize(self, cards: Sequence[Sequence[int]]) -> List[List[int]]:
+        """Representative of the suit-isomorphism class of the hand"""
+        return self.unindex(self.index(cards))
+
+
+@lru_cache(maxsize=None)
+def hand_indexer(rounds: Tuple[int, ...]) -> HandIndexer:
+    """Shared indexer for the given cards per round"""
+    return HandIndexer(rounds)
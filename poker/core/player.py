@@ -38,6 +38,35 @@ class PlayerStatus(PlayerBase):
         }
 
 
+class PlayerSnapshot(PlayerStatus):
+    """Read-only copy of a player's status at one point of the hand"""
+
+    def __init__(self, name: str, position: int, init_chip: int, contribution: int):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'position', position)
+        object.__setattr__(self, 'init_chip', init_chip)
+        object.__setattr__(self, 'contribution', contribution)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only.')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is read-only.')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (self.name, self.position, self.init_chip, self.contribution)
+
+    @classmethod
+    def from_status(cls, status: PlayerStatus) -> 'PlayerSnapshot':
+        return cls(status.name, status.position, status.init_chip, status.contribution)
+
+
 class PlayerResult(PlayerBase):
     win_chip: int
 
@@ -1,13 +1,13 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from poker.core import Card, PlayerResult, History
 
 
 class Result:
-    private_card: List[Optional[List[Card]]]
-    public_card: List[Card]
+    private_card: List[Optional[Sequence[Card]]]
+    public_card: Sequence[Card]
     players: List[PlayerResult]
-    history: List[List[History]]
+    history: Sequence[Sequence[History]]
 
     @property
     def win_money(self):
@@ -1,5 +1,5 @@
 import json
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 from poker.core import Card, ActionType, PlayerStatus, History
 
@@ -9,10 +9,10 @@ class State:
     action_position: int
     legal_actions: List[ActionType]
     raise_range: Optional[Tuple[int, int]]
-    private_card: List[Card]
-    public_card: List[Card]
-    players: List[PlayerStatus]
-    history: List[List[History]]
+    private_card: Sequence[Card]
+    public_card: Sequence[Card]
+    players: Sequence[PlayerStatus]
+    history: Sequence[Sequence[History]]
 
     def __repr__(self):
         return json.dumps(self.json())
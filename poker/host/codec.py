@@ -0,0 +1,375 @@
+import json
+import struct
+from typing import List, Optional, Tuple
+
+from poker.core.card import deck
+from poker.host.delta import DELTA_FIELDS, STATE_FIELDS
+from poker.host.utils import recv_frame, send_frame
+from poker.ia.action import IaActionType
+
+# Encodings a client can ask for with the 'encoding' field of its connect message
+JSON = 'json'
+BINARY = 'binary'
+ENCODINGS = (JSON, BINARY)
+
+# A binary message starts with its kind. The fixed layout of the kind follows and then, when the message has fields
+# beyond that layout, a JSON object of them up to the end. A message that does not fit its layout is sent as JSON.
+KIND_JSON = 0
+KIND_STATE = 1
+KIND_RESULT = 2
+KIND_ACTION = 3
+KIND_READY = 4
+KIND_DELTA = 5
+
+# Cards are their codes, 1 to 52
+CODE_BY_CARD = {card.json(): card.code for card in deck}
+CARD_BY_CODE = [''] + [card.json() for card in deck]
+
+# Legal actions are bits of a mask, in the order the environment lists them, and one more bit tells that a raise
+# range follows.
+LEGAL_ACTIONS = ['fold', 'check', 'call', 'raise']
+HAS_RAISE_RANGE = 1 << len(LEGAL_ACTIONS)
+# Steps of the action history are (position, action type, raise to)
+ACTION_TYPES = {str(action_type): action_type.value for action_type in
+                (IaActionType.FOLD, IaActionType.CHECK, IaActionType.CALL)}
+ACTION_NAMES = {value: name for name, value in ACTION_TYPES.items()}
+
+STATE_HEADER = struct.Struct('<BBB')
+RAISE_RANGE = struct.Struct('<II')
+STATE_PLAYER = struct.Struct('<Bii')
+# Chips left of a player, in a delta
+MONEY_LEFT = struct.Struct('<Bi')
+# Winnings and chips left may be fractions after a split pot; a flag bit for each tells whether it was an integer.
+RESULT_PLAYER = struct.Struct('<BBddi')
+STEP = struct.Struct('<BBI')
+ACTION = struct.Struct('<BBI')
+
+RESULT_FIELDS = {'info', 'player_card', 'public_card', 'players', 'action_history'}
+ACTION_FIELDS = {'info', 'action'}
+READY_FIELDS = {'info', 'status'}
+
+
+def _encode_name(name: str) -> bytes:
+    data = name.encode('utf-8')
+    return bytes([len(data)]) + data
+
+
+def _decode_name(data: memoryview, offset: int) -> Tuple[str, int]:
+    end = offset + 1 + data[offset]
+    return bytes(data[offset + 1:end]).decode('utf-8'), end
+
+
+def _encode_cards(cards: List[str]) -> bytes:
+    return bytes([len(cards)] + [CODE_BY_CARD[card] for card in cards])
+
+
+def _decode_cards(data: memoryview, offset: int) -> Tuple[List[str], int]:
+    end = offset + 1 + data[offset]
+    return [CARD_BY_CODE[code] for code in data[offset + 1:end]], end
+
+
+def _encode_history(history: List[List[dict]]) -> bytes:
+    out = bytearray([len(history)])
+    for stage in history:
+        out.append(len(stage))
+        for step in stage:
+            if step['timestamp'] != '':
+                raise ValueError('Timestamps are not encoded.')
+            action = step['action']
+            if action in ACTION_TYPES:
+                out += STEP.pack(step['position'], ACTION_TYPES[action], 0)
+            elif action[0] == 'r':
+                out += STEP.pack(step['position'], IaActionType.RAISE.value, int(action[1:]))
+            else:
+                raise ValueError(f'Invalid action string: {action}')
+    return bytes(out)
+
+
+def _decode_history(data: memoryview, offset: int) -> Tuple[List[List[dict]], int]:
+    history = []
+    for _ in range(data[offset]):
+        num_step = data[offset + 1]
+        offset += 1
+        stage = []
+        for _ in range(num_step):
+            position, action_type, amount = STEP.unpack_from(data, offset + 1)
+            offset += STEP.size
+            action = f'r{amount}' if action_type == IaActionType.RAISE.value else ACTION_NAMES[action_type]
+            stage.append({'position': position, 'action': action, 'timestamp': ''})
+        history.append(stage)
+    return history, offset + 1
+
+
+def _encode_extra(message: dict, fields: set) -> bytes:
+    extra = {key: value for key, value in message.items() if key not in fields}
+    return json.dumps(extra).encode('utf-8') if extra else b''
+
+
+def _decode_extra(message: dict, data: memoryview, offset: int) -> dict:
+    if offset < len(data):
+        message.update(json.loads(bytes(data[offset:]).decode('utf-8')))
+    return message
+
+
+def _encode_legal(message: dict) -> bytes:
+    legal_mask = 0
+    for action in message['legal_actions']:
+        legal_mask |= 1 << LEGAL_ACTIONS.index(action)
+    if [action for action in LEGAL_ACTIONS if legal_mask >> LEGAL_ACTIONS.index(action) & 1] \
+            != message['legal_actions']:
+        raise ValueError('Legal actions out of order.')
+    raise_range = message['raise_range']
+    if not raise_range:
+        return bytes([legal_mask])
+    return bytes([legal_mask | HAS_RAISE_RANGE]) + RAISE_RANGE.pack(*raise_range)
+
+
+def _decode_legal(data: memoryview, offset: int) -> Tuple[List[str], List[int], int]:
+    legal_mask = data[offset]
+    legal_actions = [action for i, action in enumerate(LEGAL_ACTIONS) if legal_mask >> i & 1]
+    if not legal_mask & HAS_RAISE_RANGE:
+        return legal_actions, [], offset + 1
+    return legal_actions, list(RAISE_RANGE.unpack_from(data, offset + 1)), offset + 1 + RAISE_RANGE.size
+
+
+def _encode_state(message: dict) -> bytes:
+    out = bytearray(STATE_HEADER.pack(KIND_STATE, message['position'], message['action_position']))
+    out += _encode_legal(message)
+    out += _encode_cards(message['private_card'])
+    out += _encode_cards(message['public_card'])
+    out.append(len(message['players']))
+    for player in message['players']:
+        out += STATE_PLAYER.pack(player['position'], player['money_left'], player['total_money'])
+        out += _encode_name(player['name'])
+        if set(player) != {'position', 'money_left', 'total_money', 'name'}:
+            raise ValueError('Unknown player fields.')
+    out += _encode_history(message['action_history'])
+    return bytes(out) + _encode_extra(message, STATE_FIELDS)
+
+
+def _decode_state(data: memoryview) -> dict:
+    _, position, action_position = STATE_HEADER.unpack_from(data)
+    legal_actions, raise_range, offset = _decode_legal(data, STATE_HEADER.size)
+    private_card, offset = _decode_cards(data, offset)
+    public_card, offset = _decode_cards(data, offset)
+    players = []
+    num_player = data[offset]
+    offset += 1
+    for _ in range(num_player):
+        player_position, money_left, total_money = STATE_PLAYER.unpack_from(data, offset)
+        name, offset = _decode_name(data, offset + STATE_PLAYER.size)
+        players.append({'position': player_position, 'money_left': money_left, 'total_money': total_money,
+                        'name': name})
+    history, offset = _decode_history(data, offset)
+    return _decode_extra({
+        'info': 'state',
+        'position': position,
+        'action_position': action_position,
+        'legal_actions': legal_actions,
+        'raise_range': raise_range,
+        'private_card': private_card,
+        'public_card': public_card,
+        'players': players,
+        'action_history': history
+    }, data, offset)
+
+
+def _encode_result(message: dict) -> bytes:
+    out = bytearray([KIND_RESULT, len(message['player_card'])])
+    for cards in message['player_card']:
+        out += _encode_cards(cards)
+    out += _encode_cards(message['public_card'])
+    out.append(len(message['players']))
+    for player in message['players']:
+        win_money, money_left = player['win_money'], player['money_left']
+        if not all(isinstance(value, (int, float)) for value in (win_money, money_left)):
+            raise ValueError('Chips must be numbers.')
+        flags = isinstance(win_money, int) | isinstance(money_left, int) << 1
+        out += RESULT_PLAYER.pack(player['position'], flags, win_money, money_left, player['total_money'])
+        out += _encode_name(player['name'])
+        if set(player) != {'position', 'win_money', 'money_left', 'total_money', 'name'}:
+            raise ValueError('Unknown player fields.')
+    out += _encode_history(message['action_history'])
+    return bytes(out) + _encode_extra(message, RESULT_FIELDS)
+
+
+def _decode_result(data: memoryview) -> dict:
+    player_card = []
+    offset = 2
+    for _ in range(data[1]):
+        cards, offset = _decode_cards(data, offset)
+        player_card.append(cards)
+    public_card, offset = _decode_cards(data, offset)
+    players = []
+    num_player = data[offset]
+    offset += 1
+    for _ in range(num_player):
+        position, flags, win_money, money_left, total_money = RESULT_PLAYER.unpack_from(data, offset)
+        name, offset = _decode_name(data, offset + RESULT_PLAYER.size)
+        players.append({'position': position,
+                        'win_money': int(win_money) if flags & 1 else win_money,
+                        'money_left': int(money_left) if flags & 2 else money_left,
+                        'total_money': total_money,
+                        'name': name})
+    history, offset = _decode_history(data, offset)
+    return _decode_extra({
+        'info': 'result',
+        'player_card': player_card,
+        'public_card': public_card,
+        'players': players,
+        'action_history': history
+    }, data, offset)
+
+
+def _encode_action(message: dict) -> bytes:
+    action = message['action']
+    if action in ACTION_TYPES:
+        out = ACTION.pack(KIND_ACTION, ACTION_TYPES[action], 0)
+    elif action[0] == 'r':
+        out = ACTION.pack(KIND_ACTION, IaActionType.RAISE.value, int(action[1:]))
+    else:
+        raise ValueError(f'Invalid action string: {action}')
+    return out + _encode_extra(message, ACTION_FIELDS)
+
+
+def _decode_action(data: memoryview) -> dict:
+    _, action_type, amount = ACTION.unpack_from(data)
+    action = f'r{amount}' if action_type == IaActionType.RAISE.value else ACTION_NAMES[action_type]
+    return _decode_extra({'info': 'action', 'action': action}, data, ACTION.size)
+
+
+def _encode_ready(message: dict) -> bytes:
+    if message['status'] != 'start':
+        raise ValueError('Only the start status is encoded.')
+    return bytes([KIND_READY]) + _encode_extra(message, READY_FIELDS)
+
+
+def _decode_ready(data: memoryview) -> dict:
+    return _decode_extra({'info': 'ready', 'status': 'start'}, data, 1)
+
+
+def _encode_delta(message: dict) -> bytes:
+    out = bytearray([KIND_DELTA, message['action_position']])
+    out += _encode_legal(message)
+    out += _encode_cards(message['public_card'])
+    out.append(len(message['money_left']))
+    for position, money_left in message['money_left']:
+        out += MONEY_LEFT.pack(position, money_left)
+    out += _encode_history(message['action_history'])
+    return bytes(out) + _encode_extra(message, DELTA_FIELDS)
+
+
+def _decode_delta(data: memoryview) -> dict:
+    legal_actions, raise_range, offset = _decode_legal(data, 2)
+    public_card, offset = _decode_cards(data, offset)
+    money_left = []
+    for i in range(data[offset]):
+        money_left.append(list(MONEY_LEFT.unpack_from(data, offset + 1 + i * MONEY_LEFT.size)))
+    history, offset = _decode_history(data, offset + 1 + len(money_left) * MONEY_LEFT.size)
+    return _decode_extra({
+        'info': 'delta',
+        'action_position': data[1],
+        'legal_actions': legal_actions,
+        'raise_range': raise_range,
+        'public_card': public_card,
+        'money_left': money_left,
+        'action_history': history
+    }, data, offset)
+
+
+ENCODERS = {'state': _encode_state, 'result': _encode_result, 'action': _encode_action, 'ready': _encode_ready,
+            'delta': _encode_delta}
+DECODERS = {KIND_STATE: _decode_state, KIND_RESULT: _decode_result, KIND_ACTION: _decode_action,
+            KIND_READY: _decode_ready, KIND_DELTA: _decode_delta}
+
+
+def encode(message: dict) -> bytes:
+    """Binary payload of a protocol message, `decode` gives the message back as it was"""
+    encoder = ENCODERS.get(message.get('info'))
+    if encoder is not None:
+        try:
+            return encoder(message)
+        except (KeyError, IndexError, TypeError, ValueError, struct.error):
+            pass
+    return bytes([KIND_JSON]) + json.dumps(message).encode('utf-8')
+
+
+def decode(payload: bytes) -> dict:
+    """The message of a payload made by `encode`, raises ValueError if it is not one"""
+    data = memoryview(payload)
+    if not data or data[0] != KIND_JSON and data[0] not in DECODERS:
+        raise ValueError('Unknown message kind.')
+    if data[0] == KIND_JSON:
+        return json.loads(bytes(data[1:]).decode('utf-8'))
+    try:
+        return DECODERS[data[0]](data)
+    except (IndexError, KeyError, struct.error) as e:
+        raise ValueError(f'Truncated or invalid binary message: {e}')
+
+
+def send_message(conn, message: dict):
+    """Blocking send of a binary message, for clients that asked for the binary encoding"""
+    send_frame(conn, encode(message))
+
+
+def recv_message(conn) -> Optional[dict]:
+    """Blocking receive of a binary message, None once the host has closed the connection"""
+    data = recv_frame(conn)
+    return None if data is None else decode(data)
+
+
+if __name__ == '__main__':
+    import time
+
+    from poker.host.match import RandomAgent
+    from poker.ia.action import IaAction
+    from poker.ia.compact_env import CompactEnv
+    from poker.ia.deal import RandomDealer
+
+    def server_messages(num_player: int, num_hand: int) -> Tuple[List[dict], List[dict]]:
+        """What a host sends in `num_hand` random hands, and what the players answer"""
+        agent = RandomAgent(0)
+        env = CompactEnv([f'player{i}' for i in range(num_player)], RandomDealer(0))
+        sent, answers = [], []
+        for _ in range(num_hand):
+            env.reset()
+            while not env.is_over():
+                states = [env.get_state(i).json() for i in range(num_player)]
+                sent.extend(states)
+                answers.append({'info': 'action', 'action': agent(states[env.position])})
+                env.new_action(IaAction.parse(answers[-1]['action']))
+                if not env.is_over() and env.is_stage_over():
+                    env.new_stage()
+            result = env.result.json()
+            sent.extend([result] * num_player)
+            answers.extend([{'info': 'ready', 'status': 'start'}] * num_player)
+        return sent, answers
+
+    for num_player in (2, 6):
+        num_hand = 2000
+        sent, answers = server_messages(num_player, num_hand)
+        messages = sent + answers
+        for message in messages:
+            assert decode(encode(message)) == message, message
+        assert all(encode(message)[0] != KIND_JSON for message in messages)
+
+        json_size = sum(len(json.dumps(message).encode('utf-8')) for message in sent)
+        binary_size = sum(len(encode(message)) for message in sent)
+        start = time.perf_counter()
+        payloads = [encode(message) for message in messages]
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        decode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        json_payloads = [json.dumps(message).encode('utf-8') for message in messages]
+        json_encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for payload in json_payloads:
+            json.loads(payload.decode('utf-8'))
+        json_decode_time = time.perf_counter() - start
+        print(f'{num_player} players: {json_size / num_hand:8,.0f} JSON bytes/hand, '
+              f'{binary_size / num_hand:8,.0f} binary bytes/hand ({binary_size / json_size:.0%})')
+        print(f'{"":11}encode {encode_time / len(messages) * 1e6:5.1f} us (JSON {json_encode_time / len(messages) * 1e6:5.1f} us), '
+              f'decode {decode_time / len(messages) * 1e6:5.1f} us (JSON {json_decode_time / len(messages) * 1e6:5.1f} us) per message')
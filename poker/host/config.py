@@ -1,11 +1,77 @@
+from typing import Optional
+
+from poker.core.card import deck
+from poker.core.constants import NUM_HAND_CARD, NUM_PUBLIC_CARD
+from poker.host.match import StoppingRule
+
+# As many players as one deck can deal to
+MAX_PLAYER = (len(deck) - NUM_PUBLIC_CARD) // NUM_HAND_CARD
+
+
 class GameConfig:
     num_player: int
     num_hand: int
+    duplicate: bool
+    stopping: Optional[StoppingRule]
+    action_timeout: Optional[float]
+    time_bank: float
 
     def __init__(self, raw: dict):
         self.num_player = raw.get('room_number') or raw.get('num_player')
         self.num_hand = raw.get('game_number') or raw.get('num_hand')
+        self.duplicate = bool(raw.get('duplicate', False))
+        # With `sequential`, the game may end before `num_hand` once the result is clear.
+        self.stopping = StoppingRule(raw.get('stop_z', 3.), raw.get('stop_margin'), raw.get('min_hand', 1000)) \
+            if raw.get('sequential') else None
+        # Seconds each player has for an action, plus a bank per game to draw on when they take longer
+        self.action_timeout = raw.get('action_timeout')
+        self.time_bank = raw.get('time_bank', 0.)
 
     def __eq__(self, other: 'GameConfig'):
         return self.num_player == other.num_player \
-               and self.num_hand == other.num_hand
+               and self.num_hand == other.num_hand \
+               and self.duplicate == other.duplicate \
+               and self.stopping == other.stopping \
+               and self.action_timeout == other.action_timeout \
+               and self.time_bank == other.time_bank
+
+    def __hash__(self):
+        return hash((self.num_player, self.num_hand, self.duplicate, self.stopping, self.action_timeout,
+                     self.time_bank))
+
+    def __repr__(self):
+        return f'GameConfig(num_player={self.num_player}, num_hand={self.num_hand}, duplicate={self.duplicate}, ' \
+               f'stopping={self.stopping}, action_timeout={self.action_timeout}, time_bank={self.time_bank})'
+
+    def json(self) -> dict:
+        """Connect message fields that give back this configuration"""
+        ret = {'num_player': self.num_player, 'num_hand': self.num_hand, 'duplicate': self.duplicate,
+               'action_timeout': self.action_timeout, 'time_bank': self.time_bank}
+        if self.stopping is not None:
+            ret.update(sequential=True, stop_z=self.stopping.z, stop_margin=self.stopping.margin,
+                       min_hand=self.stopping.min_hand)
+        return ret
+
+    def check(self):
+        """Raise ValueError unless a game can be played with this configuration"""
+        if not isinstance(self.num_player, int) or not 2 <= self.num_player <= MAX_PLAYER:
+            raise ValueError(f'Number of players must be from 2 to {MAX_PLAYER}, got {self.num_player}.')
+        if not isinstance(self.num_hand, int) or self.num_hand < 1:
+            raise ValueError(f'Number of hands must be positive, got {self.num_hand}.')
+        if self.duplicate and self.num_hand % self.num_player:
+            raise ValueError(f'In duplicate mode the number of hands must be a multiple of the {self.num_player} '
+                             f'players, so that every deal is played from every seat, got {self.num_hand}.')
+        if self.action_timeout is not None and not (isinstance(self.action_timeout, (int, float))
+                                                    and self.action_timeout > 0):
+            raise ValueError(f'Action timeout must be a positive number of seconds, got {self.action_timeout}.')
+        if not isinstance(self.time_bank, (int, float)) or self.time_bank < 0:
+            raise ValueError(f'Time bank must be a number of seconds, got {self.time_bank}.')
+        stopping = self.stopping
+        if stopping is not None:
+            if not isinstance(stopping.z, (int, float)) or not stopping.z > 0:
+                raise ValueError(f'Stopping z must be a positive number, got {stopping.z}.')
+            if stopping.margin is not None and (not isinstance(stopping.margin, (int, float))
+                                                or not stopping.margin >= 0):
+                raise ValueError(f'Stopping margin must be a number of mbb/hand, got {stopping.margin}.')
+            if not isinstance(stopping.min_hand, int) or stopping.min_hand < 1:
+                raise ValueError(f'Minimum number of hands must be positive, got {stopping.min_hand}.')
@@ -0,0 +1,145 @@
+import copy
+from typing import List, Optional, Tuple
+
+# Updates a client can ask for with the 'updates' field of its connect message
+FULL = 'full'
+DELTA = 'delta'
+UPDATES = (FULL, DELTA)
+
+# Fields of a full state and of a delta, the binary encoding has a fixed layout for each
+STATE_FIELDS = {'info', 'position', 'action_position', 'legal_actions', 'raise_range', 'private_card', 'public_card',
+                'players', 'action_history'}
+DELTA_FIELDS = {'info', 'action_position', 'legal_actions', 'raise_range', 'public_card', 'money_left',
+                'action_history'}
+
+
+def diff_state(prev: dict, curr: dict) -> Optional[dict]:
+    """
+    What changed from one state of a hand to the next, as a 'delta' message for `apply_delta`, None if the change is
+    not an update within the hand. A delta carries the new action position, legal actions and raise range in full,
+    and only the additions otherwise: the public cards dealt, the chips left of the players whose stack changed as
+    [position, money_left] pairs, and the actions taken, the first list of them going on the last stage of `prev` and
+    any other being a new stage.
+    """
+    if set(prev) != STATE_FIELDS or set(curr) != STATE_FIELDS:
+        return None
+    if prev['position'] != curr['position'] or prev['private_card'] != curr['private_card']:
+        return None
+    public_card = curr['public_card']
+    if public_card[:len(prev['public_card'])] != prev['public_card']:
+        return None
+    if len(prev['players']) != len(curr['players']):
+        return None
+    money_left = []
+    for prev_player, curr_player in zip(prev['players'], curr['players']):
+        if prev_player['money_left'] != curr_player['money_left']:
+            if dict(prev_player, money_left=curr_player['money_left']) != curr_player:
+                return None
+            money_left.append([curr_player['position'], curr_player['money_left']])
+        elif prev_player != curr_player:
+            return None
+    prev_history, curr_history = prev['action_history'], curr['action_history']
+    num_stage = len(prev_history)
+    if num_stage == 0 or len(curr_history) < num_stage or curr_history[:num_stage - 1] != prev_history[:-1]:
+        return None
+    last_stage = curr_history[num_stage - 1]
+    if last_stage[:len(prev_history[-1])] != prev_history[-1]:
+        return None
+    return {
+        'info': 'delta',
+        'action_position': curr['action_position'],
+        'legal_actions': curr['legal_actions'],
+        'raise_range': curr['raise_range'],
+        'public_card': public_card[len(prev['public_card']):],
+        'money_left': money_left,
+        'action_history': [last_stage[len(prev_history[-1]):]] + curr_history[num_stage:]
+    }
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """
+    The state following `state` given the 'delta' message made by `diff_state`, `state` itself is left as it is.
+    Fields the host adds to a delta beyond those, such as a 'request_id', replace the ones of the state.
+    """
+    state = copy.deepcopy(state)
+    state['action_position'] = delta['action_position']
+    state['legal_actions'] = list(delta['legal_actions'])
+    state['raise_range'] = list(delta['raise_range'])
+    state['public_card'] += delta['public_card']
+    players = {player['position']: player for player in state['players']}
+    for position, money_left in delta['money_left']:
+        players[position]['money_left'] = money_left
+    history = delta['action_history']
+    state['action_history'][-1] += copy.deepcopy(history[0])
+    state['action_history'] += copy.deepcopy(history[1:])
+    for key, value in delta.items():
+        if key not in DELTA_FIELDS:
+            state[key] = copy.deepcopy(value)
+    return state
+
+
+class StateTracker:
+    """Client side of delta updates: the full state of the hand rebuilt from the snapshot and the deltas after it"""
+    state: Optional[dict]
+
+    def __init__(self):
+        self.state = None
+
+    def update(self, message: dict) -> dict:
+        """The full state after a 'state' or 'delta' message"""
+        if message['info'] == 'state':
+            self.state = message
+        elif message['info'] == 'delta':
+            if self.state is None:
+                raise ValueError('Delta received before any state.')
+            self.state = apply_delta(self.state, message)
+        else:
+            raise ValueError(f'Not a state update: {message["info"]}')
+        return self.state
+
+
+if __name__ == '__main__':
+    import json
+
+    from poker.host.codec import decode, encode
+    from poker.host.match import RandomAgent
+    from poker.ia.action import IaAction
+    from poker.ia.compact_env import CompactEnv
+    from poker.ia.deal import RandomDealer
+
+    def state_messages(num_player: int, num_hand: int) -> Tuple[List[List[dict]], int]:
+        """The states each player is sent in `num_hand` random hands, one list per player and hand"""
+        agent = RandomAgent(0)
+        env = CompactEnv([f'player{i}' for i in range(num_player)], RandomDealer(0))
+        hands, num_action = [], 0
+        for _ in range(num_hand):
+            env.reset()
+            sent = [[] for _ in range(num_player)]
+            while not env.is_over():
+                states = [env.get_state(i).json() for i in range(num_player)]
+                for i, state in enumerate(states):
+                    sent[i].append(state)
+                env.new_action(IaAction.parse(agent(states[env.position])))
+                num_action += 1
+                if not env.is_over() and env.is_stage_over():
+                    env.new_stage()
+            hands.extend(sent)
+        return hands, num_action
+
+    for num_player in (2, 6):
+        num_hand = 2000
+        hands, num_action = state_messages(num_player, num_hand)
+        size = dict.fromkeys(['full JSON', 'delta JSON', 'full binary', 'delta binary'], 0)
+        for states in hands:
+            tracker = StateTracker()
+            for i, state in enumerate(states):
+                message = state if i == 0 else diff_state(states[i - 1], state)
+                assert message is not None
+                assert decode(encode(message)) == message
+                assert tracker.update(json.loads(json.dumps(message))) == state
+                size['full JSON'] += len(json.dumps(state).encode('utf-8'))
+                size['delta JSON'] += len(json.dumps(message).encode('utf-8'))
+                size['full binary'] += len(encode(state))
+                size['delta binary'] += len(encode(message))
+        print(f'{num_player} players, {num_action / num_hand:.1f} actions per hand, state bytes per hand: ' +
+              ', '.join(f'{name} {value / num_hand:,.0f}' for name, value in size.items()))
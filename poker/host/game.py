@@ -1,57 +1,183 @@
-from typing import Dict
+import asyncio
+import json
+from typing import Dict, List, Optional, TextIO
 
-from poker.ia.action import IaAction
+from poker.ia.action import IaAction, IaActionType, IaCheck, IaFold
 from poker.host.config import GameConfig
+from poker.host.delta import diff_state
+from poker.host.luck import hand_record
+from poker.host.match import MatchResult, STOP_MAX_HAND
 from poker.host.player import GamePlayer
+from poker.ia.deal import DuplicateDealer, RandomDealer
 from poker.ia.env import Env
 
 
 class PokerGame:
+    """
+    Plays `config.num_hand` hands between the connected players. In duplicate mode every deal is played once per
+    player with the seats moving by one each time, and the result of the last hand on a deal also carries what each
+    player won over the whole deal. With a stopping rule the game can end early, and the result of the last hand
+    says why. Given a `history` file, every hand is written to it as a line of JSON with all the hole cards, for
+    offline analysis such as `poker.host.luck`.
+    With an action timeout, a player who has not acted in time, counting their time bank, checks if they can and
+    folds otherwise, and the result of each hand lists these timeouts with the time left in each bank. Every state and
+    result then carries a 'request_id' for the answer to repeat; answers tagged with an earlier id are dropped.
+    Players who asked for delta updates are sent the first state of a hand in full and only what changed afterwards.
+    """
     config: GameConfig
     players: Dict[str, GamePlayer]
+    match_result: Optional[MatchResult]
+    history: Optional[TextIO]
+    time_bank: Dict[str, float]
+    request_id: int
 
-    def __init__(self, config: GameConfig):
+    def __init__(self, config: GameConfig, history: Optional[TextIO] = None):
         self.config = config
         self.players = {}
+        self.match_result = None
+        self.history = history
+        self.time_bank = {}
+        self.request_id = 0
 
-    def __del__(self):
+    def close(self):
         for player in self.players.values():
-            player.conn.close()
+            player.close()
 
     def add_player(self, player: GamePlayer, config: GameConfig) -> bool:
         if config != self.config:
             raise ValueError(f'Player {player.name} claimed inconsistent game configuration.')
-        if player.name in self.players.values():
+        if player.name in self.players:
             raise ValueError(f'Name {player.name} already exists.')
         self.players[player.name] = player
         return len(self.players) >= self.config.num_player
 
-    def start(self):
-        env = Env(list(self.players.keys()))
+    async def start(self):
+        names = list(self.players.keys())
+        num_player = len(names)
+        duplicate = self.config.duplicate
+        stopping = self.config.stopping
+        env = Env(names, DuplicateDealer(RandomDealer(), num_player) if duplicate else None)
+        # One sample per hand, or per deal in duplicate mode
+        self.match_result = MatchResult(num_player, num_player if duplicate else 1)
+        sample_chip = dict.fromkeys(names, 0.)
+        self.time_bank = dict.fromkeys(names, float(self.config.time_bank))
         for i in range(1, self.config.num_hand + 1):
+            if duplicate:
+                rotation = (i - 1) % num_player
+                env.player_names = names[rotation:] + names[:rotation]
             env.reset()
+            timeouts = []
+            # Last state sent to each player asking for deltas
+            sent_state = {}
             while not env.is_over():
-                for player_name, state in env.all_states():
-                    self.players[player_name].send(state.json())
                 action_player_name = env.players[env.position].name
+                self.request_id += 1
+                for player_name, state in env.all_states():
+                    player = self.players[player_name]
+                    state_json = state.json()
+                    message = state_json
+                    if player.delta:
+                        delta = diff_state(sent_state[player_name], state_json) if player_name in sent_state else None
+                        sent_state[player_name] = state_json
+                        message = state_json if delta is None else delta
+                    await player.send(self._tag(message))
+                    if state.position == state.action_position:
+                        legal_actions = state.legal_actions
 
-                action_data = self.players[action_player_name].recv()
-                if action_data.get('info') != 'action' or not action_data.get('action'):
-                    raise ValueError(f'Player {action_player_name} sent invalid action.')
-                action_raw = action_data.get('action')
-                action = IaAction.parse(action_raw)
+                action_data = await self._request(self.players[action_player_name], 'action')
+                if action_data is None:
+                    action = IaCheck() if IaActionType.CHECK in legal_actions else IaFold()
+                    timeouts.append({'name': action_player_name, 'stage': env.curr_stage, 'action': str(action)})
+                else:
+                    if action_data.get('info') != 'action' or not action_data.get('action'):
+                        raise ValueError(f'Player {action_player_name} sent invalid action.')
+                    action_raw = action_data.get('action')
+                    action = IaAction.parse(action_raw)
                 env.new_action(action)
                 if not env.is_over() and env.is_stage_over():
                     env.new_stage()
 
+            result = env.result.json()
+            if self.config.action_timeout is not None:
+                result['timeouts'] = timeouts
+                result['time_bank'] = dict(self.time_bank)
+            if self.history is not None:
+                self.history.write(json.dumps(hand_record(env)) + '\n')
+            for name, chip in zip(env.player_names, env.win_chip):
+                sample_chip[name] += chip
+            if not duplicate or rotation == num_player - 1:
+                self.match_result.add([sample_chip[name] / self.match_result.hands_per_sample for name in names])
+                if duplicate:
+                    result['duplicate'] = self._duplicate_json(names, sample_chip)
+                sample_chip = dict.fromkeys(names, 0.)
+                if stopping is not None:
+                    self.match_result.stop_reason = stopping.check(self.match_result)
+            if stopping is not None and (self.match_result.stop_reason is not None or i == self.config.num_hand):
+                self.match_result.stop_reason = self.match_result.stop_reason or STOP_MAX_HAND
+                result['stop'] = self._stop_json(names)
+            self.request_id += 1
+            result = self._tag(result)
             for player in self.players.values():
-                player.send(env.result.json())
+                await player.send(result)
+            if self.match_result.stop_reason is not None:
+                break
 
             if i < self.config.num_hand:  # get ready
                 for player in self.players.values():
-                    ready_data = player.recv()
-                    if ready_data.get('info') != 'ready' or ready_data.get('status') != 'start':
+                    ready_data = await self._request(player, 'ready')
+                    # A player late to get ready is dealt in all the same.
+                    if ready_data is not None and (ready_data.get('info') != 'ready'
+                                                   or ready_data.get('status') != 'start'):
                         raise ValueError(f'Player {player.name} failed to get ready.')
 
+    async def _request(self, player: GamePlayer, info: str) -> Optional[dict]:
+        """
+        The player's answer to an 'action' or 'ready' request, None if it does not come in time. Answers tagged with
+        the id of an earlier request are skipped, untagged ones are taken as answers to this request, and time taken
+        for an action beyond the timeout comes out of the bank.
+        """
+        timeout = self.config.action_timeout
+        if timeout is None:
+            return await player.recv()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        bank = self.time_bank[player.name] if info == 'action' else 0.
+        try:
+            while True:
+                data = await player.recv(max(start + timeout + bank - loop.time(), 0.))
+                if data.get('info') not in ('action', 'ready'):
+                    return data
+                if data.get('info') == info and data.get('request_id', self.request_id) == self.request_id:
+                    return data
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if info == 'action':
+                self.time_bank[player.name] = max(bank - max(loop.time() - start - timeout, 0.), 0.)
+
+    def _tag(self, message: dict) -> dict:
+        """The message with the id of the current request, when answers have a deadline"""
+        if self.config.action_timeout is None:
+            return message
+        return dict(message, request_id=self.request_id)
 
+    def _duplicate_json(self, names: List[str], deal_chip: Dict[str, float]) -> dict:
+        """Chips each player won over the last deal, and the running duplicate estimate in mbb per hand"""
+        result = self.match_result
+        return {
+            'deal_number': result.num_sample,
+            'win_money': dict(deal_chip),
+            'mbb_per_hand': {name: result.mbb_per_hand(i) for i, name in enumerate(names)},
+            'interval': {name: list(result.interval(i)) for i, name in enumerate(names)}
+        }
 
+    def _stop_json(self, names: List[str]) -> dict:
+        """Why the game ended and the final estimate, with the interval of the stopping rule"""
+        result = self.match_result
+        z = self.config.stopping.z
+        return {
+            'reason': result.stop_reason,
+            'num_hand': result.num_hand,
+            'mbb_per_hand': {name: result.mbb_per_hand(i) for i, name in enumerate(names)},
+            'interval': {name: list(result.interval(i, z)) for i, name in enumerate(names)}
+        }
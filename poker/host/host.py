@@ -1,39 +1,132 @@
-import socket
+import asyncio
+import logging
+from typing import List, Optional, Set, TextIO, Tuple
 
+from poker.host.codec import BINARY, ENCODINGS, JSON, encode
 from poker.host.config import GameConfig
+from poker.host.delta import DELTA, FULL, UPDATES
 from poker.host.game import PokerGame
+from poker.host.matchmaker import AdmissionError, Matchmaker, DEFAULT_MAX_ROOM, DEFAULT_MAX_QUEUED
 from poker.host.player import GamePlayer
-from poker.host.utils import recv_json
+from poker.host.utils import read_json, write_frame, write_json
 
+# Seconds a new connection has to send its connect message
+CONNECT_TIMEOUT = 10.
+# Longest connect message in bytes and longest player name, which keep a room small enough to hand to a worker
+MAX_CONNECT = 4096
+MAX_NAME = 64
+
+logger = logging.getLogger(__name__)
 
-class Host:
-    socket: socket.socket
 
-    def __init__(self, port, max_conn=233):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.bind(port)
-        self.socket.listen(max_conn)
+async def play_game(config: GameConfig, players: List[GamePlayer], history: Optional[TextIO] = None):
+    """Play a game between the players, a game that fails is logged and its players disconnected"""
+    game = PokerGame(config, history)
+    for player in players:
+        game.add_player(player, config)
+    try:
+        await game.start()
+    except (ValueError, ConnectionError, asyncio.IncompleteReadError) as e:
+        logger.warning('Game of %s aborted: %s', ', '.join(game.players), e)
+    finally:
+        game.close()
 
-    def __del__(self):
-        self.socket.close()
 
-    def _accept(self) -> socket:
-        return self.socket.accept()[0]
+class Host:
+    """
+    Serves any number of rooms at once on one event loop. Players are queued by the game they ask for and every room
+    that can be filled plays its game while the host goes on accepting, see `Matchmaker`. Players the host cannot
+    take get an error message, {'info': 'error', 'message': ...}, and are disconnected at once. The connect message is
+    always JSON; with 'encoding': 'binary' in it, every later message to and from the player is encoded by
+    `poker.host.codec` instead, and with 'updates': 'delta' the player is sent the first state of each hand in full
+    and only what changed afterwards, see `poker.host.delta`.
+    """
+    address: Tuple[str, int]
+    max_conn: int
+    history_path: Optional[str]
+    history: Optional[TextIO]
+    matchmaker: Matchmaker
+    games: Set[asyncio.Task]
+
+    def __init__(self, port: Tuple[str, int], max_conn: int = 233, history_path: Optional[str] = None,
+                 max_room: int = DEFAULT_MAX_ROOM, max_queued: int = DEFAULT_MAX_QUEUED):
+        self.address = port
+        self.max_conn = max_conn
+        # Every hand played is appended to `history_path` when given, see `PokerGame`.
+        self.history_path = history_path
+        self.history = None
+        self.matchmaker = Matchmaker(max_room, max_queued)
+        self.games = set()
 
     def run(self):
-        while 1:
-            master_conn = self._accept()
-            master_raw = recv_json(master_conn)
-            master_config = GameConfig(master_raw)
-            game = PokerGame(master_config)
-            room_full = game.add_player(GamePlayer(master_raw['name'], master_conn), master_config)
-
-            while not room_full:
-                sub_conn = self._accept()
-                sub_raw = recv_json(sub_conn)
-                sub_config = GameConfig(sub_raw)
-                room_full = game.add_player(GamePlayer(sub_raw['name'], sub_conn), sub_config)
-
-            game.start()
-            del game
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle, *self.address, backlog=self.max_conn)
+        if self.history_path is not None:
+            self.history = open(self.history_path, 'a')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.history is not None:
+                self.history.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        binary = False
+        try:
+            raw = await asyncio.wait_for(read_json(reader, MAX_CONNECT), CONNECT_TIMEOUT)
+            if raw is None:
+                writer.close()
+                return
+            if not isinstance(raw, dict) or 'name' not in raw:
+                raise ValueError('Connect message needs a name.')
+            name = str(raw['name'])
+            if len(name) > MAX_NAME:
+                raise ValueError(f'Name must be at most {MAX_NAME} characters long.')
+            encoding = raw.get('encoding', JSON)
+            if encoding not in ENCODINGS:
+                raise ValueError(f'Unknown encoding {encoding}, expected one of {", ".join(ENCODINGS)}.')
+            binary = encoding == BINARY
+            updates = raw.get('updates', FULL)
+            if updates not in UPDATES:
+                raise ValueError(f'Unknown updates {updates}, expected one of {", ".join(UPDATES)}.')
+            config = GameConfig(raw)
+            config.check()
+            self.matchmaker.join(GamePlayer(name, reader, writer, binary, updates == DELTA), config)
+        except (AdmissionError, ValueError, TypeError) as e:
+            await self._reject(writer, str(e), binary)
+            return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        self._schedule()
+
+    async def _reject(self, writer: asyncio.StreamWriter, message: str, binary: bool = False):
+        logger.info('Rejected a connection: %s', message)
+        error = {'info': 'error', 'message': message}
+        try:
+            if binary:
+                await write_frame(writer, encode(error))
+            else:
+                await write_json(writer, error)
+        except ConnectionError:
+            pass
+        writer.close()
+
+    def _schedule(self):
+        """Start every game that can be filled"""
+        while True:
+            room = self.matchmaker.next_room()
+            if room is None:
+                return
+            task = asyncio.ensure_future(self._play(*room))
+            self.games.add(task)
+            task.add_done_callback(self.games.discard)
+
+    async def _play(self, config: GameConfig, players: List[GamePlayer]):
+        try:
+            await play_game(config, players, self.history)
+        finally:
+            self.matchmaker.finish()
+            self._schedule()
@@ -0,0 +1,151 @@
+import argparse
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from poker.core import Card
+from poker.core.card import card_codes
+from poker.core.constants import NUM_PUBLIC_CARD
+from poker.ia.action import IaAction
+from poker.ia.batch import HandKeys
+from poker.ia.compact_env import CompactEnv
+from poker.ia.deal import Dealer, Deal
+from poker.ia.env import Env
+from poker.ia.equity import combination_index
+
+DEFAULT_NUM_SAMPLE = 1000
+# Runouts of up to this many cards are enumerated, longer ones are sampled
+MAX_EXACT_RUNOUT = 2
+# Public cards shown in each stage
+NUM_STAGE_CARD = [0, 3, 4, 5]
+
+# Public cards being dealt: the stage they start, who has folded and what each player has put in the pot
+ChanceNode = Tuple[int, Tuple[bool, ...], Tuple[int, ...]]
+
+
+def chance_node(env: CompactEnv) -> ChanceNode:
+    """The chance node that started the current stage, taken right after `new_stage`"""
+    return env.curr_stage, tuple(env.folded), tuple(env.contribution)
+
+
+def pot_shares(hands: List[Sequence[int]], public_cards: Sequence[int], dead_cards: Iterable[int] = (),
+               num_sample: int = DEFAULT_NUM_SAMPLE, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Expected share of the pot of each holding at showdown, over every runout of the board when only a card or two
+    are missing and over `num_sample` random runouts otherwise
+    """
+    dead = {code for hand in hands for code in hand} | set(public_cards) | set(dead_cards)
+    deck = np.array([code for code in range(1, len(card_codes) + 1) if code not in dead], dtype=np.intp)
+    num_runout = NUM_PUBLIC_CARD - len(public_cards)
+    if num_runout <= MAX_EXACT_RUNOUT:
+        runouts = deck[combination_index(len(deck), num_runout)]
+    else:
+        rng = rng or np.random.default_rng()
+        runouts = deck[rng.random((num_sample, len(deck))).argpartition(num_runout, axis=1)[:, :num_runout]]
+    boards = HandKeys.of(runouts) + HandKeys.of(list(public_cards))
+    ranks = np.stack([(boards + HandKeys.of(list(hand))).rank() for hand in hands], axis=1)
+    winners = ranks == ranks.max(axis=1, keepdims=True)
+    return (winners / winners.sum(axis=1, keepdims=True)).mean(axis=0)
+
+
+def luck_adjustment(private_cards: Sequence[Sequence[int]], public_cards: Sequence[int],
+                    chance_nodes: List[ChanceNode], num_sample: int = DEFAULT_NUM_SAMPLE,
+                    rng: Optional[np.random.Generator] = None) -> List[float]:
+    """
+    Chips each player got from the public cards beyond what they could expect: at every chance node, the change in
+    each live player's expected share of the pot times the pot. It averages to zero whatever the players do, so
+    winnings minus it keep their mean with most of the card luck taken out, and a hand that is all-in before the
+    river is paid its all-in equity.
+    """
+    all_cards = [code for hand in private_cards for code in hand]
+    adjustment = [0.] * len(private_cards)
+    shares: Dict[Tuple[Tuple[int, ...], int], np.ndarray] = {}
+
+    def live_shares(live: Tuple[int, ...], num_public: int) -> np.ndarray:
+        if (live, num_public) not in shares:
+            shares[live, num_public] = pot_shares([private_cards[i] for i in live], public_cards[:num_public],
+                                                  all_cards, num_sample, rng)
+        return shares[live, num_public]
+
+    for stage, folded, contribution in chance_nodes:
+        live = tuple(i for i, fold in enumerate(folded) if not fold)
+        if len(live) < 2:
+            continue
+        before = live_shares(live, NUM_STAGE_CARD[stage - 1])
+        after = live_shares(live, NUM_STAGE_CARD[stage])
+        pot = sum(contribution)
+        for i, share_before, share_after in zip(live, before, after):
+            adjustment[i] += float(share_after - share_before) * pot
+    return adjustment
+
+
+def hand_record(env: Union[Env, CompactEnv]) -> dict:
+    """Result message of a finished hand with every player's hole cards, as `adjust_record` needs"""
+    record = env.result.json()
+    record['player_card'] = [[card.json() for card in cards] for cards in env.private_cards]
+    return record
+
+
+class _RecordDealer(Dealer):
+    """Deals the cards of a recorded hand"""
+    cards: Deal
+
+    def __init__(self, cards: Deal):
+        self.cards = cards
+
+    def deal(self, num_player: int) -> Deal:
+        return self.cards
+
+
+def adjust_record(record: dict, num_sample: int = DEFAULT_NUM_SAMPLE,
+                  rng: Optional[np.random.Generator] = None) -> List[float]:
+    """Luck-adjusted winnings of each position in a hand record, replaying its actions to find the chance nodes"""
+    private_cards = [[Card.from_rank_suit(card) for card in cards] for cards in record['player_card']]
+    if not all(private_cards):
+        raise ValueError('Luck adjustment needs the hole cards of every player.')
+    public_cards = [Card.from_rank_suit(card) for card in record['public_card']]
+    env = CompactEnv([player['name'] for player in record['players']],
+                     _RecordDealer(([tuple(cards) for cards in private_cards], tuple(public_cards))))
+    env.reset()
+    nodes = []
+    for stage, steps in enumerate(record['action_history']):
+        if stage:
+            env.new_stage()
+            nodes.append(chance_node(env))
+        for step in steps:
+            env._new_action(step['position'], IaAction.parse(step['action']))
+    adjustment = luck_adjustment([[card.code for card in cards] for cards in private_cards],
+                                 [card.code for card in public_cards], nodes, num_sample, rng)
+    return [player['win_money'] - luck for player, luck in zip(record['players'], adjustment)]
+
+
+if __name__ == '__main__':
+    from poker.host.match import MatchResult
+
+    parser = argparse.ArgumentParser(description='Raw and luck-adjusted winnings of each player in hand records.')
+    parser.add_argument('history', help='file of hand records, one JSON object per line')
+    parser.add_argument('--num-sample', type=int, default=DEFAULT_NUM_SAMPLE,
+                        help='random boards per preflop equity')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(args.seed)
+    names: List[str] = []
+    raw_result = adjusted_result = None
+    with open(args.history) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            hand = json.loads(line)
+            if raw_result is None:
+                names = sorted(player['name'] for player in hand['players'])
+                raw_result, adjusted_result = MatchResult(len(names)), MatchResult(len(names))
+            by_name = {player['name']: i for i, player in enumerate(hand['players'])}
+            adjusted = adjust_record(hand, args.num_sample, generator)
+            raw_result.add([hand['players'][by_name[name]]['win_money'] for name in names])
+            adjusted_result.add([adjusted[by_name[name]] for name in names])
+    if raw_result is None:
+        raise SystemExit(f'No hands in {args.history}.')
+    print('raw:', raw_result.report(names), sep='\n')
+    print('luck-adjusted:', adjusted_result.report(names), sep='\n')
@@ -0,0 +1,319 @@
+import argparse
+import importlib
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from poker.core.constants import BIG_BLIND
+from poker.host.luck import chance_node, luck_adjustment
+from poker.ia.action import IaAction, IaRaise
+from poker.ia.compact_env import CompactEnv
+from poker.ia.deal import DuplicateDealer, RandomDealer
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Why a match ended, see `StoppingRule`
+STOP_SIGNIFICANT = 'significant'
+STOP_MARGIN = 'margin'
+STOP_MAX_HAND = 'max_hand'
+
+# An agent answers the state message of the socket protocol, as a dict, with an action string such as 'call' or 'r300'.
+Agent = Callable[[dict], str]
+AgentFactory = Callable[[], Agent]
+
+
+class CallAgent:
+    """Checks or calls every time"""
+
+    def __call__(self, state: dict) -> str:
+        return 'check' if 'check' in state['legal_actions'] else 'call'
+
+
+class RandomAgent:
+    """Picks a legal action at random, raising to at most three times the minimum"""
+    rng: random.Random
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, state: dict) -> str:
+        action = self.rng.choice(state['legal_actions'])
+        if action == 'raise':
+            low, high = state['raise_range']
+            return f'r{self.rng.randint(low, min(high, low * 3))}'
+        return action
+
+
+def load_agent(spec: str) -> AgentFactory:
+    """Agent factory from 'package.module:name', e.g. 'poker.host.match:CallAgent'"""
+    module, _, name = spec.partition(':')
+    if not name:
+        raise ValueError(f'Expected module:name, got {spec}.')
+    return getattr(importlib.import_module(module), name)
+
+
+def check_action(state: dict, action: IaAction):
+    if str(action.type) not in state['legal_actions']:
+        raise ValueError(f'Illegal action {action}.')
+    if isinstance(action, IaRaise) and not state['raise_range'][0] <= action.amount <= state['raise_range'][1]:
+        raise ValueError(f'Raise to {action.amount} out of range {state["raise_range"]}.')
+
+
+def play_hands(agent_factories: List[AgentFactory], num_hand: int, seed: Optional[int] = None,
+               first_hand: int = 0, duplicate: bool = False,
+               luck_adjusted: Optional[List[List[float]]] = None) -> List[List[float]]:
+    """
+    Play hands between the agents and return the chips each agent won in each hand.
+    The seats move by one every hand, counted from `first_hand`, so that every agent sits in every position.
+    In duplicate mode every deal is played once per agent, with the seats moving by one each time.
+    Given a `luck_adjusted` list, the winnings of each hand with the luck of the public cards taken out are appended
+    to it, see `luck_adjustment`.
+    """
+    agents = [factory() for factory in agent_factories]
+    num_agent = len(agents)
+    dealer = RandomDealer(seed)
+    if duplicate:
+        if first_hand % num_agent or num_hand % num_agent:
+            raise ValueError(f'Duplicate hands come in groups of {num_agent}.')
+        dealer = DuplicateDealer(dealer, num_agent)
+    env = CompactEnv([f'seat{i}' for i in range(num_agent)], dealer)
+    rng = np.random.default_rng(seed)
+    results = []
+    for hand in range(first_hand, first_hand + num_hand):
+        # Agent `(seat + hand) % num_agent` plays in `seat`.
+        env.reset()
+        nodes = []
+        while not env.is_over():
+            seat = env.position
+            agent = (seat + hand) % num_agent
+            state = env.get_state(seat).json()
+            try:
+                action = IaAction.parse(agents[agent](state))
+                check_action(state, action)
+            except ValueError as e:
+                raise ValueError(f'Agent {agent} sent an invalid action: {e}') from e
+            env.new_action(action)
+            if not env.is_over() and env.is_stage_over():
+                env.new_stage()
+                nodes.append(chance_node(env))
+        win_chip = env.win_chip
+        results.append([win_chip[(agent - hand) % num_agent] for agent in range(num_agent)])
+        if luck_adjusted is not None:
+            luck = luck_adjustment([[card.code for card in cards] for cards in env.private_cards],
+                                   [card.code for card in env.public_card_all], nodes, rng=rng)
+            luck_adjusted.append([win_chip[seat] - luck[seat]
+                                  for seat in ((agent - hand) % num_agent for agent in range(num_agent))])
+    return results
+
+
+def _play_chunk(agent_factories: List[AgentFactory], num_hand: int, seed: Optional[int], first_hand: int,
+                duplicate: bool, luck: bool) -> Tuple[List[List[float]], Optional[List[List[float]]]]:
+    luck_adjusted = [] if luck else None
+    return play_hands(agent_factories, num_hand, seed, first_hand, duplicate, luck_adjusted), luck_adjusted
+
+
+def pair_results(results: List[List[float]], num_agent: int) -> List[List[float]]:
+    """Average chips per hand of each agent over every group of `num_agent` hands played on the same deal"""
+    return [[sum(chips) / num_agent for chips in zip(*results[start:start + num_agent])]
+            for start in range(0, len(results), num_agent)]
+
+
+class MatchResult:
+    """
+    Chips won per hand by each agent, reported in milli-big-blinds per hand. A sample is one hand, or in duplicate
+    matches the average over the `hands_per_sample` hands played on one deal.
+    """
+    num_sample: int
+    hands_per_sample: int
+    win_sum: List[float]
+    win_square_sum: List[float]
+    stop_reason: Optional[str]
+    luck_adjusted: Optional['MatchResult']
+
+    def __init__(self, num_agent: int, hands_per_sample: int = 1):
+        self.num_sample = 0
+        self.hands_per_sample = hands_per_sample
+        self.win_sum = [0.] * num_agent
+        self.win_square_sum = [0.] * num_agent
+        self.stop_reason = None
+        self.luck_adjusted = None
+
+    def add(self, win_chip: List[float]):
+        self.num_sample += 1
+        for i, chip in enumerate(win_chip):
+            self.win_sum[i] += chip
+            self.win_square_sum[i] += chip * chip
+
+    def extend(self, results: Iterable[List[float]]):
+        for win_chip in results:
+            self.add(win_chip)
+
+    @property
+    def num_agent(self) -> int:
+        return len(self.win_sum)
+
+    @property
+    def num_hand(self) -> int:
+        return self.num_sample * self.hands_per_sample
+
+    def mbb_per_hand(self, agent: int) -> float:
+        return self.win_sum[agent] / self.num_sample / BIG_BLIND * 1000 if self.num_sample else 0.
+
+    def std_error(self, agent: int) -> float:
+        """Standard error of `mbb_per_hand`"""
+        if self.num_sample < 2:
+            return math.inf
+        mean = self.win_sum[agent] / self.num_sample
+        variance = (self.win_square_sum[agent] - self.num_sample * mean ** 2) / (self.num_sample - 1)
+        return math.sqrt(max(variance, 0.) / self.num_sample) / BIG_BLIND * 1000
+
+    def interval(self, agent: int, z: float = 1.96) -> Tuple[float, float]:
+        """Normal-approximation confidence interval of `mbb_per_hand`, 95% by default"""
+        margin = z * self.std_error(agent)
+        return self.mbb_per_hand(agent) - margin, self.mbb_per_hand(agent) + margin
+
+    def json(self, z: float = 1.96) -> dict:
+        ret = {
+            'num_hand': self.num_hand,
+            'num_sample': self.num_sample,
+            'stop_reason': self.stop_reason,
+            'agents': [{
+                'mbb_per_hand': self.mbb_per_hand(i),
+                'std_error': self.std_error(i),
+                'interval': list(self.interval(i, z))
+            } for i in range(self.num_agent)]
+        }
+        if self.luck_adjusted is not None:
+            ret['luck_adjusted'] = self.luck_adjusted.json(z)
+        return ret
+
+    def report(self, names: Optional[List[str]] = None) -> str:
+        names = names or [f'agent{i}' for i in range(self.num_agent)]
+        lines = [f'{self.num_hand} hands']
+        if self.hands_per_sample > 1:
+            lines[0] += f' on {self.num_sample} duplicate deals'
+        if self.stop_reason is not None:
+            lines[0] += f', stopped: {self.stop_reason}'
+        for i, name in enumerate(names):
+            low, high = self.interval(i)
+            lines.append(f'{name}: {self.mbb_per_hand(i):+.1f} mbb/hand, 95% CI [{low:+.1f}, {high:+.1f}]')
+        if self.luck_adjusted is not None:
+            lines.append('luck-adjusted:')
+            lines.extend(self.luck_adjusted.report(names).split('\n')[1:])
+        return '\n'.join(lines)
+
+
+class StoppingRule:
+    """
+    Ends a match once every agent's result is significantly different from zero, or once every interval is
+    narrower than `margin` mbb/hand either side. Looking at the results again and again stops on chance more often
+    than a single test at the same `z`, hence the wider default interval.
+    """
+    z: float
+    margin: Optional[float]
+    min_hand: int
+
+    def __init__(self, z: float = 3., margin: Optional[float] = None, min_hand: int = 1000):
+        self.z = z
+        self.margin = margin
+        self.min_hand = min_hand
+
+    def __eq__(self, other: 'StoppingRule'):
+        return isinstance(other, StoppingRule) \
+               and (self.z, self.margin, self.min_hand) == (other.z, other.margin, other.min_hand)
+
+    def __hash__(self):
+        return hash((self.z, self.margin, self.min_hand))
+
+    def __repr__(self):
+        return f'StoppingRule(z={self.z}, margin={self.margin}, min_hand={self.min_hand})'
+
+    def check(self, result: MatchResult) -> Optional[str]:
+        """Why the match can stop now, or None to go on"""
+        if result.num_hand < self.min_hand:
+            return None
+        intervals = [result.interval(i, self.z) for i in range(result.num_agent)]
+        if all(low > 0 or high < 0 for low, high in intervals):
+            return STOP_SIGNIFICANT
+        if self.margin is not None and all(high - low <= 2 * self.margin for low, high in intervals):
+            return STOP_MARGIN
+        return None
+
+
+def run_match(agent_factories: List[AgentFactory], num_hand: int, num_worker: Optional[int] = None,
+              seed: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              callback: Optional[Callable[[MatchResult], None]] = None, duplicate: bool = False,
+              stopping: Optional[StoppingRule] = None, luck: bool = False) -> MatchResult:
+    """
+    Play `num_hand` hands over a process pool, `chunk_size` hands per task. Results are added as tasks finish
+    and `callback` sees the running totals after each one. With a `stopping` rule the match ends as soon as it is
+    met after a task, and `num_hand` is only the cap.
+    With `luck` the result also carries the luck-adjusted winnings, which the stopping rule then goes by.
+    In duplicate mode every deal is played once from each seat and the results are paired by deal, which cancels
+    most of the luck of the cards; `num_hand` and `chunk_size` are rounded up to whole deals.
+    """
+    num_agent = len(agent_factories)
+    if num_agent < 2:
+        raise ValueError('Need at least two agents.')
+    result = MatchResult(num_agent, num_agent if duplicate else 1)
+    if luck:
+        result.luck_adjusted = MatchResult(num_agent, result.hands_per_sample)
+    if duplicate:
+        num_hand = -(-num_hand // num_agent) * num_agent
+        chunk_size = -(-chunk_size // num_agent) * num_agent
+    chunks = [(start, min(chunk_size, num_hand - start)) for start in range(0, num_hand, chunk_size)]
+    # Every chunk deals from its own stream, derived from the seed and the chunk index.
+    seeds = [None if seed is None else seed * len(chunks) + i for i in range(len(chunks))]
+    with ProcessPoolExecutor(num_worker or os.cpu_count()) as executor:
+        futures = [executor.submit(_play_chunk, agent_factories, size, chunk_seed, start, duplicate, luck)
+                   for (start, size), chunk_seed in zip(chunks, seeds)]
+        for future in as_completed(futures):
+            results, luck_adjusted = future.result()
+            result.extend(pair_results(results, num_agent) if duplicate else results)
+            if luck:
+                result.luck_adjusted.extend(pair_results(luck_adjusted, num_agent) if duplicate else luck_adjusted)
+            if stopping is not None:
+                result.stop_reason = stopping.check(result.luck_adjusted if luck else result)
+            if callback is not None:
+                callback(result)
+            if result.stop_reason is not None:
+                for pending in futures:
+                    pending.cancel()
+                break
+    if stopping is not None and result.stop_reason is None:
+        result.stop_reason = STOP_MAX_HAND
+    return result
+
+
+if __name__ == '__main__':
+    import time
+
+    parser = argparse.ArgumentParser(description='Play agents against each other in-process.')
+    parser.add_argument('-a', '--agent', action='append', required=True,
+                        help='agent factory as module:name, once per agent')
+    parser.add_argument('-n', '--num-hand', type=int, default=100000)
+    parser.add_argument('-w', '--num-worker', type=int, default=None)
+    parser.add_argument('-c', '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('-d', '--duplicate', action='store_true', help='play every deal once from each seat')
+    parser.add_argument('-l', '--luck', action='store_true', help='also report luck-adjusted winnings')
+    parser.add_argument('-s', '--sequential', action='store_true',
+                        help='stop early once the result is clear, NUM_HAND becomes the cap')
+    parser.add_argument('--z', type=float, default=3., help='width of the stopping interval in standard errors')
+    parser.add_argument('--margin', type=float, default=None,
+                        help='also stop once every result is known within this many mbb/hand')
+    parser.add_argument('--min-hand', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    match_result = run_match([load_agent(spec) for spec in args.agent], args.num_hand, args.num_worker, args.seed,
+                             args.chunk_size, duplicate=args.duplicate,
+                             stopping=StoppingRule(args.z, args.margin, args.min_hand) if args.sequential else None,
+                             luck=args.luck)
+    elapsed = time.perf_counter() - start_time
+    print(match_result.report(args.agent))
+    print(f'{match_result.num_hand / elapsed * 3600:,.0f} hands/hour')
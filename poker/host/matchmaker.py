@@ -0,0 +1,78 @@
+from typing import Dict, List, Optional, Tuple
+
+from poker.host.config import GameConfig
+from poker.host.player import GamePlayer
+
+DEFAULT_MAX_ROOM = 64
+DEFAULT_MAX_QUEUED = 256
+
+
+class AdmissionError(Exception):
+    """A player the host cannot take, the message is sent back to them"""
+
+
+class Matchmaker:
+    """
+    Players waiting for a game, queued by configuration and seated first come first served as soon as enough of
+    them want the same game. At most `max_room` games are played at once and `max_queued` players wait.
+    """
+    max_room: int
+    max_queued: int
+    queues: Dict[GameConfig, List[GamePlayer]]
+    num_queued: int
+    num_active: int
+
+    def __init__(self, max_room: int = DEFAULT_MAX_ROOM, max_queued: int = DEFAULT_MAX_QUEUED):
+        self.max_room = max_room
+        self.max_queued = max_queued
+        self.queues = {}
+        self.num_queued = 0
+        self.num_active = 0
+
+    def join(self, player: GamePlayer, config: GameConfig):
+        self._prune()
+        if self.num_queued >= self.max_queued:
+            raise AdmissionError(f'{self.num_queued} players are already waiting, try again later.')
+        queue = self.queues.setdefault(config, [])
+        if any(waiting.name == player.name for waiting in queue):
+            raise AdmissionError(f'Name {player.name} is already waiting for this game.')
+        queue.append(player)
+        self.num_queued += 1
+
+    def next_room(self) -> Optional[Tuple[GameConfig, List[GamePlayer]]]:
+        """Players of the next game to start, None while no game can be filled or too many are running"""
+        if self.num_active >= self.max_room:
+            return None
+        self._prune()
+        for config, queue in self.queues.items():
+            if len(queue) >= config.num_player:
+                players = queue[:config.num_player]
+                del queue[:config.num_player]
+                if not queue:
+                    del self.queues[config]
+                self.num_queued -= len(players)
+                self.num_active += 1
+                return config, players
+        return None
+
+    def requeue(self, config: GameConfig, players: List[GamePlayer]):
+        """Put back the players of a room that could not start, ahead of those who came after them"""
+        self.queues.setdefault(config, [])[:0] = players
+        self.num_queued += len(players)
+
+    def _prune(self):
+        """Players who hung up while waiting give up their seat, and queues left empty are dropped"""
+        for config, queue in list(self.queues.items()):
+            connected = [player for player in queue if not player.reader.at_eof()]
+            for player in queue:
+                if player.reader.at_eof():
+                    player.close()
+            self.num_queued -= len(queue) - len(connected)
+            if connected:
+                queue[:] = connected
+            else:
+                del self.queues[config]
+
+    def finish(self):
+        """A game has ended, leaving room for another"""
+        self.num_active -= 1
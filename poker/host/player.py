@@ -1,18 +1,67 @@
-from socket import socket
+import asyncio
+import json
+from typing import Optional
 
-from poker.host.utils import recv_json, send_json
+from poker.host.codec import decode, encode
+from poker.host.utils import read_frame, write_frame
+
+# Longest message in bytes a player may send during a game, actions and ready messages are far shorter
+MAX_MESSAGE = 4096
 
 
 class GamePlayer:
+    """
+    A connected player. Messages are read by a task of their own into `inbox`, so that waiting for one can time out
+    without cutting a message in half. Messages are JSON unless the player asked for the binary encoding, and the
+    states of a hand after its first come as deltas to players who asked for them, see `poker.host.delta`.
+    """
     name: str
-    conn: socket
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    binary: bool
+    delta: bool
+    inbox: Optional[asyncio.Queue]
+    _reading: Optional[asyncio.Task]
 
-    def __init__(self, name: str, conn: socket):
+    def __init__(self, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 binary: bool = False, delta: bool = False):
         self.name = name
-        self.conn = conn
+        self.reader = reader
+        self.writer = writer
+        self.binary = binary
+        self.delta = delta
+        self.inbox = None
+        self._reading = None
+
+    async def _read(self):
+        try:
+            while True:
+                data = await read_frame(self.reader, MAX_MESSAGE)
+                if data is not None:
+                    data = decode(data) if self.binary else json.loads(data.decode('utf-8'))
+                self.inbox.put_nowait(data)
+                if data is None:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # A player who sends something unreadable or too long is disconnected, as after hanging up.
+            self.writer.close()
+            self.inbox.put_nowait(None)
+
+    async def recv(self, timeout: Optional[float] = None) -> dict:
+        """The next message, raises asyncio.TimeoutError if none comes within `timeout` seconds"""
+        if self._reading is None:
+            self.inbox = asyncio.Queue()
+            self._reading = asyncio.ensure_future(self._read())
+        data = await asyncio.wait_for(self.inbox.get(), timeout)
+        if data is None:
+            self.inbox.put_nowait(None)
+            raise ConnectionError(f'Player {self.name} disconnected.')
+        return data
 
-    def recv(self) -> dict:
-        return recv_json(self.conn)
+    async def send(self, data: dict):
+        await write_frame(self.writer, encode(data) if self.binary else json.dumps(data).encode('utf-8'))
 
-    def send(self, data: dict):
-        send_json(self.conn, data)
+    def close(self):
+        if self._reading is not None:
+            self._reading.cancel()
+        self.writer.close()
@@ -1,7 +1,11 @@
+import asyncio
 import json
 import struct
 from typing import Optional
 
+# Length of the payload that follows, JSON unless the player asked for the binary encoding, see `poker.host.codec`
+HEADER = struct.Struct('i')
+
 
 def recv_json(conn) -> Optional[dict]:
     data = conn.recv(4)
@@ -17,4 +21,58 @@ def recv_json(conn) -> Optional[dict]:
 def send_json(conn, json_data: dict):
     data = json.dumps(json_data).encode('utf-8')
     conn.send(struct.pack('i', len(data)))
-    conn.sendall(data)
\ No newline at end of file
+    conn.sendall(data)
+
+
+def recv_frame(conn) -> Optional[bytes]:
+    """The next payload on a blocking socket, None once the peer has closed the connection"""
+    def recv_exactly(size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('Connection closed in the middle of a message.')
+            data += chunk
+        return data
+
+    header = conn.recv(HEADER.size)
+    if not header:
+        return None
+    header += recv_exactly(HEADER.size - len(header))
+    return recv_exactly(HEADER.unpack(header)[0])
+
+
+def send_frame(conn, data: bytes):
+    conn.sendall(HEADER.pack(len(data)) + data)
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: Optional[int] = None) -> Optional[bytes]:
+    """
+    The next payload on a stream, None once the peer has closed the connection. Raises ValueError for a payload
+    longer than `max_size`, without reading it.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None
+    size = HEADER.unpack(header)[0]
+    if max_size is not None and size > max_size:
+        raise ValueError(f'Message of {size} bytes, at most {max_size} are allowed.')
+    return await reader.readexactly(size)
+
+
+async def write_frame(writer: asyncio.StreamWriter, data: bytes):
+    writer.write(HEADER.pack(len(data)) + data)
+    await writer.drain()
+
+
+async def read_json(reader: asyncio.StreamReader, max_size: Optional[int] = None) -> Optional[dict]:
+    """`recv_json` on a stream, None once the peer has closed the connection"""
+    data = await read_frame(reader, max_size)
+    return None if data is None else json.loads(data.decode('utf-8'))
+
+
+async def write_json(writer: asyncio.StreamWriter, json_data: dict):
+    await write_frame(writer, json.dumps(json_data).encode('utf-8'))
@@ -0,0 +1,228 @@
+import array
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from typing import List, Optional, Set, TextIO, Tuple
+
+from poker.host.config import GameConfig, MAX_PLAYER
+from poker.host.host import Host, play_game
+from poker.host.matchmaker import DEFAULT_MAX_ROOM, DEFAULT_MAX_QUEUED
+from poker.host.player import GamePlayer
+
+# A room goes to a worker as one message, the JSON of its configuration and players with the players' sockets attached;
+# the worker answers with one `GAME_OVER` message per room it is done with, played or dropped.
+MAX_MESSAGE = 1 << 16
+GAME_OVER = b'\x00'
+
+logger = logging.getLogger(__name__)
+
+
+def send_room(conn: socket.socket, config: GameConfig, players: List[GamePlayer]):
+    data = json.dumps({'config': config.json(),
+                       'players': [{'name': player.name, 'binary': player.binary, 'delta': player.delta}
+                                   for player in players]}).encode('utf-8')
+    fds = array.array('i', [player.writer.get_extra_info('socket').fileno() for player in players])
+    conn.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+
+
+def recv_room(conn: socket.socket) -> Optional[Tuple[GameConfig, List[dict], List[socket.socket]]]:
+    """
+    The next room sent by `send_room`, None once the other end is closed. Raises ValueError for a message that was
+    cut short or cannot be read, after closing whatever sockets came with it.
+    """
+    fds = array.array('i')
+    data, ancdata, flags, _ = conn.recvmsg(MAX_MESSAGE, socket.CMSG_SPACE(MAX_PLAYER * fds.itemsize))
+    for level, kind, fd_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(fd_data[:len(fd_data) - len(fd_data) % fds.itemsize])
+    socks = [socket.socket(fileno=fd) for fd in fds]
+    if not data and not socks:
+        return None
+    try:
+        if flags & (socket.MSG_TRUNC | socket.MSG_CTRUNC):
+            raise ValueError('Room message truncated.')
+        message = json.loads(data.decode('utf-8'))
+        if len(message['players']) != len(socks):
+            raise ValueError(f'Room of {len(message["players"])} players came with {len(socks)} sockets.')
+        return GameConfig(message['config']), message['players'], socks
+    except (ValueError, KeyError, TypeError) as e:
+        for sock in socks:
+            sock.close()
+        raise ValueError(f'Invalid room message: {e}')
+
+
+class Worker:
+    """Plays the rooms a `WorkerHost` sends it, in a process of its own"""
+    conn: socket.socket
+    history_path: Optional[str]
+    history: Optional[TextIO]
+    games: Set[asyncio.Task]
+    closed: Optional[asyncio.Future]
+
+    def __init__(self, conn: socket.socket, history_path: Optional[str] = None):
+        self.conn = conn
+        self.history_path = history_path
+        self.history = None
+        self.games = set()
+        self.closed = None
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.closed = loop.create_future()
+        if self.history_path is not None:
+            # Whole lines at a time, as every worker appends to the same file
+            self.history = open(self.history_path, 'a', buffering=1)
+        loop.add_reader(self.conn.fileno(), self._receive)
+        try:
+            await self.closed
+            if self.games:
+                await asyncio.wait(self.games)
+        finally:
+            loop.remove_reader(self.conn.fileno())
+            if self.history is not None:
+                self.history.close()
+
+    def _receive(self):
+        try:
+            room = recv_room(self.conn)
+        except ValueError as e:
+            # The host still counts the room as running until told otherwise.
+            logger.error('Dropped a room: %s', e)
+            self._game_over()
+            return
+        if room is None:
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+            self.closed.set_result(None)
+            return
+        task = asyncio.ensure_future(self._play(*room))
+        self.games.add(task)
+        task.add_done_callback(self.games.discard)
+
+    async def _play(self, config: GameConfig, options: List[dict], socks: List[socket.socket]):
+        try:
+            players = []
+            for option, sock in zip(options, socks):
+                reader, writer = await asyncio.open_connection(sock=sock)
+                players.append(GamePlayer(option['name'], reader, writer, option['binary'], option['delta']))
+            await play_game(config, players, self.history)
+        finally:
+            self._game_over()
+
+    def _game_over(self):
+        try:
+            self.conn.send(GAME_OVER)
+        except OSError:
+            pass
+
+
+def _run_worker(conn: socket.socket, history_path: Optional[str], inherited: List[socket.socket]):
+    # The host's ends of this and earlier workers' connections are closed here, so that a worker sees the connection
+    # close when the host exits.
+    for sock in inherited:
+        sock.close()
+    Worker(conn, history_path).run()
+
+
+class WorkerHost(Host):
+    """
+    A `Host` that plays its games in `num_worker` processes. Connections are accepted and queued in this process so
+    that the players of a room meet whichever worker they land on; every room that fills up is handed, sockets and
+    all, to the worker with the fewest games running. Clients must not send anything after their connect message
+    until the game starts, as this process reads up to that message only.
+    """
+    num_worker: int
+    worker_history_path: Optional[str]
+    workers: List[Optional[socket.socket]]
+    processes: List[multiprocessing.Process]
+    num_running: List[int]
+
+    def __init__(self, port: Tuple[str, int], num_worker: Optional[int] = None, max_conn: int = 233,
+                 history_path: Optional[str] = None, max_room: int = DEFAULT_MAX_ROOM,
+                 max_queued: int = DEFAULT_MAX_QUEUED):
+        # Games, and so their history, are played by the workers.
+        super().__init__(port, max_conn, None, max_room, max_queued)
+        self.num_worker = num_worker or os.cpu_count()
+        self.worker_history_path = history_path
+        self.workers = []
+        self.processes = []
+        self.num_running = []
+
+    def run(self):
+        # The workers are started before the event loop, so that they do not inherit it.
+        for _ in range(self.num_worker):
+            conn, child_conn = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            inherited = [worker for worker in self.workers if worker is not None] + [conn]
+            process = multiprocessing.Process(target=_run_worker,
+                                              args=(child_conn, self.worker_history_path, inherited), daemon=True)
+            process.start()
+            child_conn.close()
+            self.workers.append(conn)
+            self.processes.append(process)
+            self.num_running.append(0)
+        try:
+            super().run()
+        finally:
+            for conn in self.workers:
+                if conn is not None:
+                    conn.close()
+            for process in self.processes:
+                process.join()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for i, conn in enumerate(self.workers):
+            loop.add_reader(conn.fileno(), self._finished, i)
+        await super().serve()
+
+    def _schedule(self):
+        while True:
+            alive = [i for i, conn in enumerate(self.workers) if conn is not None]
+            if not alive:
+                logger.error('Every worker has exited, no game can start.')
+                return
+            room = self.matchmaker.next_room()
+            if room is None:
+                return
+            worker = min(alive, key=self.num_running.__getitem__)
+            try:
+                send_room(self.workers[worker], *room)
+            except OSError as e:
+                # The worker died before `_finished` noticed; its players wait for the next one.
+                logger.error('Could not send a room to worker %d: %s', worker, e)
+                self.matchmaker.finish()
+                self.matchmaker.requeue(*room)
+                self._worker_exited(worker)
+                continue
+            for player in room[1]:
+                player.close()
+            self.num_running[worker] += 1
+
+    def _finished(self, worker: int):
+        conn = self.workers[worker]
+        try:
+            game_over = conn.recv(len(GAME_OVER)) == GAME_OVER
+        except OSError:
+            game_over = False
+        if game_over:
+            self.num_running[worker] -= 1
+            self.matchmaker.finish()
+        else:
+            self._worker_exited(worker)
+        self._schedule()
+
+    def _worker_exited(self, worker: int):
+        """Forget a worker that is gone, and the games it was playing"""
+        conn = self.workers[worker]
+        logger.error('Worker %d exited with %d games running.', worker, self.num_running[worker])
+        asyncio.get_running_loop().remove_reader(conn.fileno())
+        conn.close()
+        self.workers[worker] = None
+        for _ in range(self.num_running[worker]):
+            self.matchmaker.finish()
+        self.num_running[worker] = 0
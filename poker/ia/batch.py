@@ -0,0 +1,141 @@
+import numpy as np
+
+from poker.core.card import card_codes
+from poker.ia.evaluator import RANK_TABLE, FLUSH_TABLE, FLUSH_SUIT, NUM_RANK, NUM_SUIT, card_rank, card_suit
+
+# Rank weights whose sums over any 7 ranks (each used at most four times) are all distinct, so the rank
+# multiset of a 7-card hand indexes a flat array directly.
+RANK_WEIGHTS = np.array([0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181], dtype=np.int64)
+
+CHUNK_SIZE = 1 << 18
+
+
+def _build_tables():
+    keys = np.fromiter(RANK_TABLE.keys(), dtype=np.int64, count=len(RANK_TABLE))
+    ranks = np.fromiter(RANK_TABLE.values(), dtype=np.uint16, count=len(RANK_TABLE))
+    counts = keys[:, None] // 5 ** np.arange(NUM_RANK, dtype=np.int64) % 5
+    seven = counts.sum(axis=1) == 7
+    weights = counts[seven] @ RANK_WEIGHTS
+    assert len(np.unique(weights)) == len(weights)
+
+    rank_table = np.zeros(weights.max() + 1, dtype=np.uint16)
+    rank_table[weights] = ranks[seven]
+    return rank_table, np.array(FLUSH_TABLE, dtype=np.uint16), np.array(FLUSH_SUIT, dtype=np.int8)
+
+
+RANK_ARRAY, FLUSH_ARRAY, FLUSH_SUIT_ARRAY = _build_tables()
+
+_CODES = np.arange(1, len(card_codes) + 1)
+CARD_WEIGHTS = np.concatenate([[0], RANK_WEIGHTS[[card_rank(code) for code in _CODES]]]).astype(np.int32)
+CARD_SUIT_KEYS = np.concatenate([[0], [1 << (3 * card_suit(code)) for code in _CODES]]).astype(np.int16)
+CARD_SUITS = np.concatenate([[-1], [card_suit(code) for code in _CODES]]).astype(np.int8)
+CARD_RANK_BITS = np.concatenate([[0], [1 << card_rank(code) for code in _CODES]]).astype(np.int16)
+CARD_SUIT_MASKS = CARD_RANK_BITS[:, None] * (CARD_SUITS[:, None] == np.arange(NUM_SUIT))
+
+
+def _evaluate_chunk(cards: np.ndarray) -> np.ndarray:
+    ranks = RANK_ARRAY[CARD_WEIGHTS[cards].sum(axis=1)]
+    flush_suits = FLUSH_SUIT_ARRAY[CARD_SUIT_KEYS[cards].sum(axis=1)]
+    flushed = np.nonzero(flush_suits >= 0)[0]
+    if len(flushed):
+        flush_cards = cards[flushed]
+        in_suit = CARD_SUITS[flush_cards] == flush_suits[flushed, None]
+        masks = (CARD_RANK_BITS[flush_cards] * in_suit).sum(axis=1)
+        ranks[flushed] = FLUSH_ARRAY[masks]
+    return ranks
+
+
+class HandKeys:
+    """Lookup keys of a batch of disjoint card sets, keys of disjoint sets add up to the keys of their union"""
+    weights: np.ndarray
+    suit_keys: np.ndarray
+    suit_masks: np.ndarray
+
+    def __init__(self, weights: np.ndarray, suit_keys: np.ndarray, suit_masks: np.ndarray):
+        self.weights = weights
+        self.suit_keys = suit_keys
+        self.suit_masks = suit_masks
+
+    @classmethod
+    def of(cls, cards) -> 'HandKeys':
+        """Keys of the card codes along the last axis"""
+        cards = np.asarray(cards, dtype=np.intp)
+        return cls(CARD_WEIGHTS[cards].sum(axis=-1, dtype=np.int32),
+                   CARD_SUIT_KEYS[cards].sum(axis=-1, dtype=np.int16),
+                   CARD_SUIT_MASKS[cards].sum(axis=-2, dtype=np.int16))
+
+    def __add__(self, other: 'HandKeys') -> 'HandKeys':
+        return HandKeys(self.weights + other.weights, self.suit_keys + other.suit_keys,
+                        self.suit_masks + other.suit_masks)
+
+    def __getitem__(self, index) -> 'HandKeys':
+        if not isinstance(index, tuple):
+            index = (index,)
+        return HandKeys(self.weights[index], self.suit_keys[index], self.suit_masks[index + (Ellipsis,)])
+
+    def rank(self) -> np.ndarray:
+        """Rank the 7-card hands the keys describe"""
+        ranks = RANK_ARRAY[self.weights]
+        flush_suits = FLUSH_SUIT_ARRAY[self.suit_keys]
+        flushed = np.nonzero(flush_suits >= 0)
+        if len(flushed[0]):
+            ranks[flushed] = FLUSH_ARRAY[self.suit_masks[flushed + (flush_suits[flushed],)]]
+        return ranks
+
+
+def evaluate_batch(cards) -> np.ndarray:
+    """Rank an (..., 7) array of card codes, the result has the leading shape and matches `evaluate`"""
+    cards = np.asarray(cards)
+    if cards.shape[-1] != 7:
+        raise ValueError(f'Expected 7 cards per hand, got {cards.shape[-1]}.')
+    flat = cards.reshape(-1, 7)
+    ranks = np.empty(len(flat), dtype=np.uint16)
+    for start in range(0, len(flat), CHUNK_SIZE):
+        ranks[start:start + CHUNK_SIZE] = _evaluate_chunk(flat[start:start + CHUNK_SIZE])
+    return ranks.reshape(cards.shape[:-1])
+
+
+def get_winner_batch(player_hands, table_cards) -> np.ndarray:
+    """Return an (N, players) mask of the winners given (N, players, 2) hole cards and (N, 5) boards"""
+    player_hands = np.asarray(player_hands)
+    table_cards = np.asarray(table_cards)
+    boards = np.broadcast_to(table_cards[:, None, :], player_hands.shape[:2] + table_cards.shape[-1:])
+    ranks = evaluate_batch(np.concatenate([player_hands, boards], axis=2))
+    return ranks == ranks.max(axis=1, keepdims=True)
+
+
+def random_hands(num_hand: int, num_card: int = 7, rng: np.random.Generator = None) -> np.ndarray:
+    """Deal `num_hand` rows of `num_card` distinct card codes"""
+    rng = rng or np.random.default_rng()
+    hands = np.empty((num_hand, num_card), dtype=np.int8)
+    for start in range(0, num_hand, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, num_hand - start)
+        hands[start:start + size] = rng.random((size, len(card_codes))).argpartition(num_card, axis=1)[:, :num_card] + 1
+    return hands
+
+
+if __name__ == '__main__':
+    import time
+
+    from poker.ia.evaluator import evaluate
+
+    def bench_scalar(hands):
+        start = time.perf_counter()
+        ranks = [evaluate(hand) for hand in hands.tolist()]
+        return np.array(ranks, dtype=np.uint16), time.perf_counter() - start
+
+    def bench_batch(hands):
+        start = time.perf_counter()
+        ranks = evaluate_batch(hands)
+        return ranks, time.perf_counter() - start
+
+    generator = np.random.default_rng(0)
+    scalar_hands = random_hands(200000, rng=generator)
+    batch_hands = random_hands(4000000, rng=generator)
+
+    scalar_ranks, scalar_time = bench_scalar(scalar_hands)
+    assert (evaluate_batch(scalar_hands) == scalar_ranks).all()
+    _, batch_time = bench_batch(batch_hands)
+
+    print(f'scalar: {len(scalar_hands) / scalar_time:12,.0f} hands/s')
+    print(f'batch:  {len(batch_hands) / batch_time:12,.0f} hands/s')
@@ -0,0 +1,373 @@
+from typing import Dict, List, Optional, Tuple
+
+from poker.core import PlayerSnapshot, PlayerResult, Card, History, State, Result
+from poker.core.constants import INIT_STACK, SMALL_BLIND, BIG_BLIND
+from poker.ia.action import IaActionType, IaAction, IaRaise, IaSmallBlind, IaBigBlind
+from poker.ia.deal import Dealer, RandomDealer
+from poker.ia.evaluator import Board
+
+NUM_STAGE = 4
+MAX_RAISE = 4
+
+
+class CompactEnv:
+    """
+    Same rules and public API as `Env`, with the hand kept in flat integer lists and counters that are updated
+    with each action instead of being recomputed from player objects and the history
+    """
+    __slots__ = ('player_names', 'num_player', 'dealer', 'private_cards', 'public_card_all', 'contribution',
+                 'stage_contribution', 'folded', 'num_active', 'stage_counts', 'curr_stage', 'position',
+                 'min_raise_by', 'max_contribution', 'num_raise', 'actions', 'action_positions', 'stage_starts',
+                 'stage_contributions', '_undo', '_win_chip', '_players_snapshot', '_history_snapshot')
+
+    player_names: List[str]
+    num_player: int
+    dealer: Dealer
+    private_cards: List[Tuple[Card, ...]]
+    public_card_all: Tuple[Card, ...]
+    contribution: List[int]
+    stage_contribution: List[int]
+    folded: List[bool]
+    num_active: int
+    # How many players still in the hand have put each amount in this stage
+    stage_counts: Dict[int, int]
+    curr_stage: int
+    position: int
+    min_raise_by: int
+    max_contribution: int
+    num_raise: int
+    # Recorded actions of the hand, `stage_starts` holds where each stage begins
+    actions: List[IaAction]
+    action_positions: List[int]
+    stage_starts: List[int]
+    # One row per stage, `stage_contribution` is the row of the current stage
+    stage_contributions: List[List[int]]
+    # What `undo` needs to take back each `apply`, seven values per action
+    _undo: List[int]
+    _win_chip: Optional[List[int]]
+    _players_snapshot: Optional[Tuple[PlayerSnapshot, ...]]
+    _history_snapshot: Optional[Tuple[Tuple[History, ...], ...]]
+
+    def __init__(self, player_names: List[str], dealer: Optional[Dealer] = None):
+        self.player_names = player_names
+        self.num_player = len(player_names)
+        self.dealer = dealer if dealer is not None else RandomDealer()
+
+    def reset(self):
+        self.private_cards, self.public_card_all = self.dealer.deal(self.num_player)
+        self.contribution = [0] * self.num_player
+        self.stage_contributions = [[0] * self.num_player for _ in range(NUM_STAGE)]
+        self.folded = [False] * self.num_player
+        self.num_active = self.num_player
+        self.curr_stage = -1
+        self.position = 0
+        self.actions = []
+        self.action_positions = []
+        self.stage_starts = []
+        self._undo = []
+        self._win_chip = None
+        self._players_snapshot = None
+        self._history_snapshot = None
+        self.new_stage()
+        self.small_blind()
+        self.big_blind()
+
+    def get_state(self, position: int) -> State:
+        ret = State()
+        ret.position = position
+        ret.action_position = self.position
+        ret.legal_actions, ret.raise_range = self._get_legal_actions()
+        ret.private_card = self.private_cards[position]
+        ret.public_card = self._get_public_card()
+        ret.players = self.players
+        ret.history = self.history
+        return ret
+
+    def all_states(self) -> Tuple[str, State]:
+        for i, name in enumerate(self.player_names):
+            yield name, self.get_state(i)
+
+    @property
+    def result(self) -> Result:
+        if not self.is_over():
+            raise AssertionError('Current hand is running.')
+        else:
+            ret = Result()
+            ret.private_card = [card_pair if not self.folded[i] else None for i, card_pair in
+                                enumerate(self.private_cards)]
+            ret.public_card = self._get_public_card()
+            ret.players = [PlayerResult.from_status(player, win_chip)
+                           for player, win_chip in zip(self.players, self.win_chip)]
+            ret.history = self.history
+            return ret
+
+    @property
+    def players(self) -> Tuple[PlayerSnapshot, ...]:
+        if self._players_snapshot is None:
+            self._players_snapshot = tuple(PlayerSnapshot(name, i, INIT_STACK, contribution) for i, (name, contribution)
+                                           in enumerate(zip(self.player_names, self.contribution)))
+        return self._players_snapshot
+
+    @property
+    def history(self) -> Tuple[Tuple[History, ...], ...]:
+        if self._history_snapshot is None:
+            ends = self.stage_starts[1:] + [len(self.actions)]
+            self._history_snapshot = tuple(
+                tuple(History(self.action_positions[i], self.actions[i]) for i in range(start, end))
+                for start, end in zip(self.stage_starts, ends))
+        return self._history_snapshot
+
+    def new_stage(self):
+        self.min_raise_by = 0
+        self.max_contribution = 0
+        self.position = 0 if self.curr_stage == -1 else 1
+        self.curr_stage += 1
+        self.stage_contribution = self.stage_contributions[self.curr_stage]
+        self.stage_counts = {0: self.num_active}
+        self.num_raise = 0
+        self.stage_starts.append(len(self.actions))
+        self._history_snapshot = None
+
+    def new_action(self, action: IaAction):
+        self._new_action(self.position, action)
+
+    def _new_action(self, position: int, action: IaAction):
+        action_type = action.type
+        if action_type == IaActionType.FOLD:
+            # A new stage starts with position 1 even if they have folded, folding again changes nothing.
+            if not self.folded[position]:
+                self.folded[position] = True
+                self.num_active -= 1
+                self._uncount(self.stage_contribution[position])
+            self._record(position, action)
+        elif action_type == IaActionType.CHECK:
+            self._record(position, action)
+        elif action_type == IaActionType.CALL:
+            self.contribute(position, self.max_contribution - self.stage_contribution[position])
+            self._record(position, action)
+        elif action_type == IaActionType.SMALL_BLIND:
+            self.contribute(position, SMALL_BLIND)
+            self.max_contribution = SMALL_BLIND
+        elif action_type == IaActionType.BIG_BLIND:
+            self.contribute(position, BIG_BLIND)
+            self.max_contribution = BIG_BLIND
+        elif action_type == IaActionType.RAISE:
+            assert isinstance(action, IaRaise)
+            raise_to = action.amount
+            self.min_raise_by = raise_to - self.max_contribution
+            self.max_contribution = raise_to
+            self.num_raise += 1
+            self.contribute(position, raise_to - self.stage_contribution[position])
+            self._record(position, action)
+        else:
+            assert False
+        self._next_position()
+
+    def apply(self, action: IaAction):
+        """Take the action of the player to act and start the next stage if this one is over, see `undo`"""
+        assert not self.is_over()
+        position = self.position
+        self._undo.extend((position, self.min_raise_by, self.max_contribution, self.num_raise,
+                           self.contribution[position], self.folded[position]))
+        self.new_action(action)
+        stage_over = not self.is_over() and self.is_stage_over()
+        if stage_over:
+            self.new_stage()
+        self._undo.append(stage_over)
+
+    def undo(self):
+        """Take back the last `apply`, restoring the betting and the stage exactly"""
+        undo = self._undo
+        if undo.pop():
+            # Every action of the new stage has been taken back, so its row is all zeros again.
+            self.stage_starts.pop()
+            self.curr_stage -= 1
+            self.stage_contribution = self.stage_contributions[self.curr_stage]
+            self.stage_counts.clear()
+            for fold, stage_contribution in zip(self.folded, self.stage_contribution):
+                if not fold:
+                    self.stage_counts[stage_contribution] = self.stage_counts.get(stage_contribution, 0) + 1
+        folded = undo.pop()
+        contribution = undo.pop()
+        self.num_raise = undo.pop()
+        self.max_contribution = undo.pop()
+        self.min_raise_by = undo.pop()
+        position = undo.pop()
+
+        self.actions.pop()
+        self.action_positions.pop()
+        if self.folded[position] and not folded:
+            self.folded[position] = False
+            self.num_active += 1
+            stage_contribution = self.stage_contribution[position]
+            self.stage_counts[stage_contribution] = self.stage_counts.get(stage_contribution, 0) + 1
+        if self.contribution[position] != contribution:
+            self.contribute(position, contribution - self.contribution[position])
+        self.position = position
+        self._win_chip = None
+        self._history_snapshot = None
+
+    def small_blind(self):
+        self._new_action(0, IaSmallBlind())
+
+    def big_blind(self):
+        self._new_action(1, IaBigBlind())
+
+    def contribute(self, position: int, amount: int):
+        stage_contribution = self.stage_contribution[position]
+        if not self.folded[position]:
+            self._uncount(stage_contribution)
+            self.stage_counts[stage_contribution + amount] = self.stage_counts.get(stage_contribution + amount, 0) + 1
+        self.contribution[position] += amount
+        self.stage_contribution[position] = stage_contribution + amount
+        self._players_snapshot = None
+
+    def _uncount(self, stage_contribution: int):
+        count = self.stage_counts[stage_contribution] - 1
+        if count:
+            self.stage_counts[stage_contribution] = count
+        else:
+            del self.stage_counts[stage_contribution]
+
+    def _next_position(self):
+        position = (self.position + 1) % self.num_player
+        while self.folded[position]:
+            position = (position + 1) % self.num_player
+        self.position = position
+
+    def is_over(self) -> bool:
+        return self.num_active == 1 or (self.curr_stage == NUM_STAGE - 1 and len(self.stage_counts) == 1)
+
+    def is_stage_over(self) -> bool:
+        return len(self.stage_counts) == 1
+
+    @property
+    def win_chip(self) -> List[int]:
+        if self._win_chip is not None:
+            return self._win_chip
+        win_chip = self._settle()
+        if self.is_over():
+            self._win_chip = win_chip
+        return win_chip
+
+    def _settle(self) -> List[int]:
+        valid_positions = [i for i, fold in enumerate(self.folded) if not fold]
+        if len(valid_positions) == 1:
+            winner_positions = valid_positions
+        else:
+            board = Board(card.code for card in self.public_card_all)
+            ranks = {i: board.evaluate(card.code for card in self.private_cards[i]) for i in valid_positions}
+            best = max(ranks.values())
+            winner_positions = [i for i in valid_positions if ranks[i] == best]
+
+        winner_chip_avg = sum([contribution for i, contribution in enumerate(self.contribution)
+                               if i not in winner_positions]) / len(winner_positions)
+        return [winner_chip_avg if i in winner_positions else -contribution
+                for i, contribution in enumerate(self.contribution)]
+
+    def _record(self, position: int, action: IaAction):
+        self.actions.append(action)
+        self.action_positions.append(position)
+        self._history_snapshot = None
+
+    def _get_public_card(self) -> Tuple[Card, ...]:
+        if self.curr_stage == 0:
+            return ()
+        elif 1 <= self.curr_stage < NUM_STAGE:
+            return self.public_card_all[:self.curr_stage + 2]
+        else:
+            assert False
+
+    def _get_legal_actions(self) -> Tuple[List[IaActionType], Optional[Tuple[int, int]]]:
+        legal_actions = [IaActionType.FOLD]
+        if self.stage_contribution[self.position] < self.max_contribution:
+            legal_actions.append(IaActionType.CALL)
+        else:
+            legal_actions.append(IaActionType.CHECK)
+
+        if self.num_raise >= MAX_RAISE:
+            raise_range = None
+        else:
+            legal_actions.append(IaActionType.RAISE)
+            min_raise_to = max(BIG_BLIND, self.max_contribution + self.min_raise_by)
+            max_raise_to = self.stage_contribution[self.position] + INIT_STACK - self.contribution[self.position]
+            min_raise_to = min(min_raise_to, max_raise_to)
+            raise_range = (min_raise_to, max_raise_to)
+        return legal_actions, raise_range
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    from copy import deepcopy
+
+    from poker.ia.action import IaFold, IaCheck, IaCall
+    from poker.ia.env import Env
+
+    def play(env, num_hand: int, seed: int) -> Tuple[List[List[int]], float]:
+        """Random legal actions, seeded so that engines with the same dealer seed play identically"""
+        policy = random.Random(seed)
+        simple_actions = {IaActionType.FOLD: IaFold(), IaActionType.CHECK: IaCheck(), IaActionType.CALL: IaCall()}
+        win_chips = []
+        start = time.perf_counter()
+        for _ in range(num_hand):
+            env.reset()
+            while not env.is_over():
+                legal_actions, raise_range = env._get_legal_actions()
+                action_type = policy.choice(legal_actions)
+                if action_type == IaActionType.RAISE:
+                    env.new_action(IaRaise(policy.randint(raise_range[0], min(raise_range[1], raise_range[0] * 3))))
+                else:
+                    env.new_action(simple_actions[action_type])
+                if not env.is_over() and env.is_stage_over():
+                    env.new_stage()
+            win_chips.append(env.win_chip)
+        return win_chips, time.perf_counter() - start
+
+    for num_player in (2, 6):
+        names = [f'player{i}' for i in range(num_player)]
+        env_win_chips, env_time = play(Env(names, RandomDealer(0)), 20000, 0)
+        compact_win_chips, compact_time = play(CompactEnv(names, RandomDealer(0)), 20000, 0)
+        assert env_win_chips == compact_win_chips
+        print(f'{num_player} players: Env {20000 / env_time:10,.0f} hands/s, '
+              f'CompactEnv {20000 / compact_time:10,.0f} hands/s')
+
+    def traverse(env: CompactEnv, depth: int) -> int:
+        """Visit the betting tree with fold, check or call and a minimum raise, taking every action back"""
+        if depth == 0 or env.is_over():
+            return 1
+        legal_actions, raise_range = env._get_legal_actions()
+        num_node = 1
+        for action_type in legal_actions:
+            env.apply(IaRaise(raise_range[0]) if action_type == IaActionType.RAISE else simple_actions[action_type])
+            num_node += traverse(env, depth - 1)
+            env.undo()
+        return num_node
+
+    def traverse_copy(env: Env, depth: int) -> int:
+        if depth == 0 or env.is_over():
+            return 1
+        legal_actions, raise_range = env._get_legal_actions()
+        num_node = 1
+        for action_type in legal_actions:
+            child = deepcopy(env)
+            child.new_action(IaRaise(raise_range[0]) if action_type == IaActionType.RAISE
+                             else simple_actions[action_type])
+            if not child.is_over() and child.is_stage_over():
+                child.new_stage()
+            num_node += traverse_copy(child, depth - 1)
+        return num_node
+
+    simple_actions = {IaActionType.FOLD: IaFold(), IaActionType.CHECK: IaCheck(), IaActionType.CALL: IaCall()}
+    names = ['player0', 'player1', 'player2']
+    compact_env, env = CompactEnv(names), Env(names)
+    compact_env.reset()
+    env.reset()
+    start = time.perf_counter()
+    num_node = traverse(compact_env, 16)
+    undo_time = time.perf_counter() - start
+    start = time.perf_counter()
+    assert traverse_copy(env, 16) == num_node
+    copy_time = time.perf_counter() - start
+    print(f'betting tree of {num_node:,} nodes: deepcopy(Env) {num_node / copy_time:10,.0f} nodes/s, '
+          f'CompactEnv.apply/undo {num_node / undo_time:10,.0f} nodes/s')
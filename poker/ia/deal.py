@@ -0,0 +1,151 @@
+import argparse
+import os
+import random
+import struct
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+from poker.core import Card
+from poker.core.card import deck
+from poker.core.constants import NUM_HAND_CARD, NUM_PUBLIC_CARD
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# magic, version, players per hand, number of hands; followed by a uint8 (hands, 2 * players + 5) array of card codes,
+# the hole cards of each player in turn and then the board
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'DEAL'
+VERSION = 1
+
+Deal = Tuple[List[Tuple[Card, ...]], Tuple[Card, ...]]
+
+CARDS_BY_CODE: List[Optional[Card]] = [None] + deck
+
+
+def num_deal_card(num_player: int) -> int:
+    return NUM_HAND_CARD * num_player + NUM_PUBLIC_CARD
+
+
+def split_deal(cards: List[Card], num_player: int) -> Deal:
+    """Hole cards of each player and the board from the dealt cards"""
+    private_cards = [tuple(cards[i * NUM_HAND_CARD:(i + 1) * NUM_HAND_CARD]) for i in range(num_player)]
+    return private_cards, tuple(cards[NUM_HAND_CARD * num_player:num_deal_card(num_player)])
+
+
+class Dealer:
+    def deal(self, num_player: int) -> Deal:
+        raise NotImplementedError
+
+
+class RandomDealer(Dealer):
+    """Deals from its own random stream, reproducible given a seed, drawing only the cards a hand needs"""
+    rng: random.Random
+    cards: List[Card]
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.cards = deck[:]
+
+    def draw(self, num_card: int) -> List[Card]:
+        # Partial Fisher-Yates shuffle, the deck does not need to be put back in order between hands.
+        cards = self.cards
+        rand = self.rng.random
+        num_left = len(cards)
+        for i in range(num_card):
+            j = i + int(rand() * (num_left - i))
+            cards[i], cards[j] = cards[j], cards[i]
+        return cards[:num_card]
+
+    def deal(self, num_player: int) -> Deal:
+        return split_deal(self.draw(num_deal_card(num_player)), num_player)
+
+
+class FileDealer(Dealer):
+    """Replays the deals of a file written by `write_deals`, `hand_number` is the next hand to deal"""
+    path: str
+    num_player: int
+    num_hand: int
+    deals: 'np.ndarray'
+    hand_number: int
+    _data: memoryview
+
+    def __init__(self, path: str, hand_number: int = 0):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, self.num_player, self.num_hand = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a deal file.')
+        # NumPy is only needed for deal files, the engine runs without it.
+        import numpy as np
+        self.deals = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size,
+                               shape=(self.num_hand, num_deal_card(self.num_player)))
+        # Reading single deals through a flat view of the mapping skips the NumPy indexing overhead.
+        self._data = self.deals.reshape(-1).data
+        self.hand_number = hand_number
+
+    def __reduce__(self):
+        return FileDealer, (self.path, self.hand_number)
+
+    def __len__(self) -> int:
+        return self.num_hand
+
+    def __getitem__(self, hand_number: int) -> Deal:
+        if not 0 <= hand_number < self.num_hand:
+            raise IndexError(f'Hand number {hand_number} out of range.')
+        num_card = num_deal_card(self.num_player)
+        start = hand_number * num_card
+        return split_deal([CARDS_BY_CODE[code] for code in self._data[start:start + num_card]], self.num_player)
+
+    def deal(self, num_player: int) -> Deal:
+        if num_player != self.num_player:
+            raise ValueError(f'Deals are for {self.num_player} players, got {num_player}.')
+        if self.hand_number >= self.num_hand:
+            raise ValueError(f'All {self.num_hand} deals have been used.')
+        self.hand_number += 1
+        return self[self.hand_number - 1]
+
+
+class DuplicateDealer(Dealer):
+    """Deals every hand of another dealer `num_repeat` times in a row, for duplicate matches"""
+    dealer: Dealer
+    num_repeat: int
+    num_deal: int
+    last_deal: Optional[Deal]
+
+    def __init__(self, dealer: Dealer, num_repeat: int):
+        self.dealer = dealer
+        self.num_repeat = num_repeat
+        self.num_deal = 0
+        self.last_deal = None
+
+    def deal(self, num_player: int) -> Deal:
+        if self.num_deal % self.num_repeat == 0:
+            self.last_deal = self.dealer.deal(num_player)
+        self.num_deal += 1
+        private_cards, public_cards = self.last_deal
+        return list(private_cards), public_cards
+
+
+def write_deals(path: str, num_hand: int, num_player: int, seed: Optional[int] = None):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    num_card = num_deal_card(num_player)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, num_player, num_hand))
+        for start in range(0, num_hand, 1 << 16):
+            size = min(1 << 16, num_hand - start)
+            drawn = rng.random((size, len(deck))).argpartition(num_card, axis=1)[:, :num_card] + 1
+            f.write(drawn.astype(np.uint8).tobytes())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a file of random deals.')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('-n', '--num-hand', type=int, required=True)
+    parser.add_argument('-p', '--num-player', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    write_deals(args.output, args.num_hand, args.num_player, args.seed)
+    print(f'Wrote {args.num_hand} deals to {args.output}')
@@ -1,39 +1,43 @@
-import random
-from copy import deepcopy
 from typing import List, Optional, Tuple
 
-from poker.ia.utils import get_winner
-from poker.core import PlayerStatus, PlayerResult, Card, History, State, Result
-from poker.core.card import all_cards
+from poker.core import PlayerStatus, PlayerSnapshot, PlayerResult, Card, History, State, Result
 from poker.core.constants import INIT_STACK, SMALL_BLIND, BIG_BLIND
 from poker.ia.action import IaActionType, IaAction, IaRaise, IaSmallBlind, IaBigBlind
+from poker.ia.deal import Dealer, RandomDealer
+from poker.ia.evaluator import Board
 
 
 class Env:
     player_names: List[str]
+    dealer: Dealer
     players: List[PlayerStatus]
     history: List[List[History]]
-    private_cards: List[List[Card]]
-    public_card_all: List[Card]
+    private_cards: List[Tuple[Card, ...]]
+    public_card_all: Tuple[Card, ...]
     min_raise_by: int
     max_contribution: int
     stage_contribution: List[int]
     position: int
     folded: List[bool]
+    _win_chip: Optional[List[int]]
+    _players_snapshot: Optional[Tuple[PlayerSnapshot, ...]]
+    _closed_history: Tuple[Tuple[History, ...], ...]
+    _history_snapshot: Optional[Tuple[Tuple[History, ...], ...]]
 
-    def __init__(self, player_names: List[str]):
+    def __init__(self, player_names: List[str], dealer: Optional[Dealer] = None):
         self.player_names = player_names
+        self.dealer = dealer if dealer is not None else RandomDealer()
 
     def reset(self):
-        cards = [Card.from_rank_suit(card_r_s) for card_r_s in all_cards]
-        random.shuffle(cards)
-
         self.players = [PlayerStatus(position=i, name=player_name, init_chip=INIT_STACK)
                         for i, player_name in enumerate(self.player_names)]
         self.history = []
-        self.private_cards = [cards[i * 2:i * 2 + 2] for i in range(self.num_player)]
-        self.public_card_all = cards[-5:]
+        self._closed_history = ()
+        self._players_snapshot = None
+        self._history_snapshot = None
+        self.private_cards, self.public_card_all = self.dealer.deal(self.num_player)
         self.folded = [False] * self.num_player
+        self._win_chip = None
         self.position = 0
         self.stage_contribution = [0] * self.num_player
         self.new_stage()
@@ -47,9 +51,9 @@ class Env:
         ret.legal_actions, ret.raise_range = self._get_legal_actions()
         ret.private_card = self.private_cards[position]
         ret.public_card = self._get_public_card()
-        ret.players = self.players
-        ret.history = self.history
-        return deepcopy(ret)
+        ret.players = self._get_players_snapshot()
+        ret.history = self._get_history_snapshot()
+        return ret
 
     def all_states(self) -> Tuple[str, State]:
         for i, player in enumerate(self.players):
@@ -65,7 +69,7 @@ class Env:
                                 enumerate(self.private_cards)]
             ret.public_card = self._get_public_card()
             ret.players = [PlayerResult.from_status(self.players[i], win_chip) for i, win_chip in enumerate(self.win_chip)]
-            ret.history = self.history
+            ret.history = self._get_history_snapshot()
             return ret
 
     @property
@@ -77,6 +81,8 @@ class Env:
         self.max_contribution = 0
         self.position = 0 if self.curr_stage == -1 else 1
         self.stage_contribution = [0] * self.num_player
+        self._closed_history = self._get_history_snapshot() if self.history else ()
+        self._history_snapshot = None
         self.history.append([])
 
     def new_action(self, action: IaAction):
@@ -120,6 +126,7 @@ class Env:
     def contribute(self, position, amount):
         self.players[position].contribution += amount
         self.stage_contribution[position] += amount
+        self._players_snapshot = None
 
     def _next_position(self):
         self.position = (self.position + 1) % self.num_player
@@ -144,11 +151,23 @@ class Env:
 
     @property
     def win_chip(self) -> List[int]:
+        # Payouts are final once the hand is over, so they are only settled once per hand.
+        if self._win_chip is not None:
+            return self._win_chip
+        win_chip = self._settle()
+        if self.is_over():
+            self._win_chip = win_chip
+        return win_chip
+
+    def _settle(self) -> List[int]:
         valid_positions = [i for i, fold in enumerate(self.folded) if not fold]
         if len(valid_positions) == 1:
-            winner_positions = valid_positions[:]
+            winner_positions = valid_positions
         else:
-            winner_positions = get_winner(self.private_cards, self.public_card_all)
+            board = Board(card.code for card in self.public_card_all)
+            ranks = {i: board.evaluate(card.code for card in self.private_cards[i]) for i in valid_positions}
+            best = max(ranks.values())
+            winner_positions = [i for i in valid_positions if ranks[i] == best]
 
         winner_chip_avg = sum([player.contribution
                                for i, player in enumerate(self.players) if i not in winner_positions]
@@ -162,10 +181,22 @@ class Env:
 
     def _record(self, position: int, action: IaAction):
         self.history[-1].append(History(position, action))
+        self._history_snapshot = None
+
+    # States share read-only snapshots, rebuilt at most once per action however many states are taken.
+    def _get_players_snapshot(self) -> Tuple[PlayerSnapshot, ...]:
+        if self._players_snapshot is None:
+            self._players_snapshot = tuple(PlayerSnapshot.from_status(player) for player in self.players)
+        return self._players_snapshot
+
+    def _get_history_snapshot(self) -> Tuple[Tuple[History, ...], ...]:
+        if self._history_snapshot is None:
+            self._history_snapshot = self._closed_history + (tuple(self.history[-1]),)
+        return self._history_snapshot
 
-    def _get_public_card(self) -> List[Card]:
+    def _get_public_card(self) -> Tuple[Card, ...]:
         if self.curr_stage == 0:
-            return []
+            return ()
         elif self.curr_stage == 1:
             return self.public_card_all[:3]
         elif self.curr_stage == 2:
@@ -0,0 +1,241 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from poker.core import Card
+from poker.core.card import all_cards, card_codes
+from poker.core.constants import NUM_HAND_CARD, NUM_PUBLIC_CARD
+from poker.core.isomorphism import hand_indexer
+from poker.ia.batch import HandKeys
+from poker.ia.utils import best_hands
+
+DEFAULT_NUM_SAMPLE = 10000
+CHECK_INTERVAL = 256
+EXACT_CACHE_SIZE = 1 << 14
+
+
+class EquityResult:
+    num_sample: int
+    num_win: int
+    num_tie: int
+    equity_sum: float
+    equity_square_sum: float
+    exact: bool
+
+    def __init__(self):
+        self.num_sample = 0
+        self.num_win = 0
+        self.num_tie = 0
+        self.equity_sum = 0.
+        self.equity_square_sum = 0.
+        self.exact = False
+
+    def add(self, winners: List[int], position: int = 0):
+        self.num_sample += 1
+        if position in winners:
+            if len(winners) == 1:
+                self.num_win += 1
+            else:
+                self.num_tie += 1
+            share = 1 / len(winners)
+            self.equity_sum += share
+            self.equity_square_sum += share * share
+
+    def merge(self, other: 'EquityResult'):
+        self.num_sample += other.num_sample
+        self.num_win += other.num_win
+        self.num_tie += other.num_tie
+        self.equity_sum += other.equity_sum
+        self.equity_square_sum += other.equity_square_sum
+
+    @property
+    def win(self) -> float:
+        return self.num_win / self.num_sample if self.num_sample else 0.
+
+    @property
+    def tie(self) -> float:
+        return self.num_tie / self.num_sample if self.num_sample else 0.
+
+    @property
+    def equity(self) -> float:
+        """Expected share of the pot, ties split evenly between the winners"""
+        return self.equity_sum / self.num_sample if self.num_sample else 0.
+
+    @property
+    def std_error(self) -> float:
+        if self.exact:
+            return 0.
+        if self.num_sample < 2:
+            return math.inf
+        variance = (self.equity_square_sum - self.num_sample * self.equity ** 2) / (self.num_sample - 1)
+        return math.sqrt(max(variance, 0.) / self.num_sample)
+
+    def interval(self, z: float = 1.96) -> Tuple[float, float]:
+        """Normal-approximation confidence interval of the equity, 95% by default"""
+        margin = z * self.std_error
+        return max(self.equity - margin, 0.), min(self.equity + margin, 1.)
+
+    def json(self) -> dict:
+        return {
+            'num_sample': self.num_sample,
+            'win': self.win,
+            'tie': self.tie,
+            'equity': self.equity,
+            'interval': list(self.interval()),
+            'exact': self.exact
+        }
+
+    @classmethod
+    def heads_up(cls, num_sample: int, num_win: int, num_tie: int, exact: bool = False) -> 'EquityResult':
+        inst = cls()
+        inst.num_sample = num_sample
+        inst.num_win = num_win
+        inst.num_tie = num_tie
+        inst.equity_sum = num_win + num_tie / 2
+        inst.equity_square_sum = num_win + num_tie / 4
+        inst.exact = exact
+        return inst
+
+
+def check_cards(private_cards: List[int], public_cards: List[int], num_opponent: int):
+    if len(private_cards) != NUM_HAND_CARD:
+        raise ValueError(f'Expected {NUM_HAND_CARD} private cards, got {len(private_cards)}.')
+    if len(public_cards) > NUM_PUBLIC_CARD:
+        raise ValueError(f'Expected at most {NUM_PUBLIC_CARD} public cards, got {len(public_cards)}.')
+    if len(set(private_cards) | set(public_cards)) != len(private_cards) + len(public_cards):
+        raise ValueError('Duplicate cards.')
+    if num_opponent < 1:
+        raise ValueError('Need at least one opponent.')
+    if len(private_cards) + len(public_cards) + NUM_PUBLIC_CARD + NUM_HAND_CARD * num_opponent > len(card_codes):
+        raise ValueError(f'Not enough cards for {num_opponent} opponents.')
+
+
+def simulate(private_cards: List[int], public_cards: List[int], num_opponent: int,
+             num_sample: int, deadline: Optional[float] = None, seed: Optional[int] = None) -> EquityResult:
+    """Sample runouts and opponent hands until `num_sample` or the `time.time()` deadline is reached"""
+    rng = random.Random(seed)
+    dead = set(private_cards) | set(public_cards)
+    deck = [code for code in card_codes.values() if code not in dead]
+    num_board = NUM_PUBLIC_CARD - len(public_cards)
+    num_draw = num_board + NUM_HAND_CARD * num_opponent
+
+    result = EquityResult()
+    while result.num_sample < num_sample:
+        if deadline is not None and time.time() >= deadline:
+            break
+        for _ in range(min(CHECK_INTERVAL, num_sample - result.num_sample)):
+            drawn = rng.sample(deck, num_draw)
+            board = public_cards + drawn[:num_board]
+            hands = [private_cards + board]
+            hands.extend(drawn[i:i + NUM_HAND_CARD] + board for i in range(num_board, num_draw, NUM_HAND_CARD))
+            result.add(best_hands(hands))
+    return result
+
+
+class EquityEstimator:
+    num_worker: int
+    executor: Optional[ProcessPoolExecutor]
+
+    def __init__(self, num_worker: Optional[int] = None):
+        self.num_worker = num_worker or os.cpu_count() or 1
+        self.executor = None
+
+    def __enter__(self) -> 'EquityEstimator':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def estimate(self, private_cards: List[Card], public_cards: List[Card], num_opponent: int = 1,
+                 num_sample: Optional[int] = None, timeout: Optional[float] = None,
+                 seed: Optional[int] = None) -> EquityResult:
+        """Estimate equity against random opponent hands within a sample budget and/or `timeout` seconds"""
+        private_codes = [card.code for card in private_cards]
+        public_codes = [card.code for card in public_cards]
+        check_cards(private_codes, public_codes, num_opponent)
+        if num_sample is None:
+            num_sample = DEFAULT_NUM_SAMPLE if timeout is None else math.inf
+        deadline = time.time() + timeout if timeout is not None else None
+        seeds = [None if seed is None else seed + i for i in range(self.num_worker)]
+
+        if self.num_worker == 1:
+            return simulate(private_codes, public_codes, num_opponent, num_sample, deadline, seeds[0])
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.num_worker)
+        budgets = [num_sample // self.num_worker + (i < num_sample % self.num_worker) if num_sample != math.inf
+                   else math.inf for i in range(self.num_worker)]
+        futures = [self.executor.submit(simulate, private_codes, public_codes, num_opponent, budget, deadline, s)
+                   for budget, s in zip(budgets, seeds) if budget]
+        result = EquityResult()
+        for future in futures:
+            result.merge(future.result())
+        return result
+
+
+def estimate_equity(private_cards: List[Card], public_cards: List[Card], num_opponent: int = 1,
+                    num_sample: Optional[int] = None, timeout: Optional[float] = None,
+                    seed: Optional[int] = None) -> EquityResult:
+    """Single-process Monte Carlo equity, see `EquityEstimator` for the parallel version"""
+    return EquityEstimator(1).estimate(private_cards, public_cards, num_opponent, num_sample, timeout, seed)
+
+
+@lru_cache(maxsize=None)
+def combination_index(n: int, k: int) -> np.ndarray:
+    """Every k-subset of range(n) in lexicographic order, one per row; the array is cached and read-only"""
+    index = list(combinations(range(n), k))
+    ret = np.array(index, dtype=np.intp).reshape(len(index), k)
+    ret.flags.writeable = False
+    return ret
+
+
+@lru_cache(maxsize=EXACT_CACHE_SIZE)
+def _enumerate(private_cards: Tuple[int, ...], public_cards: Tuple[int, ...]) -> Tuple[int, int, int]:
+    dead = set(private_cards) | set(public_cards)
+    deck = np.array([card_codes[card] for card in all_cards if card_codes[card] not in dead], dtype=np.intp)
+    num_runout = NUM_PUBLIC_CARD - len(public_cards)
+    board = HandKeys.of(public_cards)
+
+    # Our rank for every runout, indexed by the deck positions of its cards read as base-len(deck) digits.
+    runout_index = combination_index(len(deck), num_runout)
+    digits = len(deck) ** np.arange(num_runout, dtype=np.intp)
+    private_ranks = np.zeros(len(deck) ** num_runout, dtype=np.int32)
+    private_ranks[runout_index @ digits] = (HandKeys.of(deck[runout_index]) + board + HandKeys.of(private_cards)).rank()
+
+    # The opponent's hand only depends on which cards complete the board and their holding, so every such set is
+    # ranked once and compared with each way of splitting it into a runout and a holding.
+    subset_index = combination_index(len(deck), num_runout + NUM_HAND_CARD)
+    opponent_ranks = (HandKeys.of(deck[subset_index]) + board).rank()
+    num_win = num_tie = 0
+    splits = combination_index(num_runout + NUM_HAND_CARD, num_runout)
+    for split in splits:
+        diff = private_ranks[subset_index[:, split] @ digits] - opponent_ranks
+        num_win += int(np.count_nonzero(diff > 0))
+        num_tie += int(np.count_nonzero(diff == 0))
+    return len(subset_index) * len(splits), num_win, num_tie
+
+
+def exact_equity(private_cards: List[Card], public_cards: List[Card]) -> EquityResult:
+    """Heads-up equity from the flop on, enumerating every runout and every opponent holding"""
+    # Results are cached per suit-isomorphism class of the hand.
+    private_codes = [card.code for card in private_cards]
+    public_codes = [card.code for card in public_cards]
+    check_cards(private_codes, public_codes, 1)
+    if len(public_codes) < 3:
+        raise ValueError('Exact equity needs at least the flop.')
+    canonical_private, canonical_public = hand_indexer((NUM_HAND_CARD, len(public_codes))).canonicalize(
+        [private_codes, public_codes])
+    counts = _enumerate(tuple(canonical_private), tuple(canonical_public))
+    return EquityResult.heads_up(*counts, exact=True)
@@ -0,0 +1,184 @@
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+from poker.core.card import card_ranks, card_suits, card_codes
+
+NUM_RANK = len(card_ranks)
+NUM_SUIT = len(card_suits)
+
+HIGH_CARD = 0
+PAIR = 1
+TWO_PAIR = 2
+THREE_OF_A_KIND = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+FOUR_OF_A_KIND = 7
+STRAIGHT_FLUSH = 8
+
+HAND_TYPES = [
+    'HighCard', 'Pair', 'TwoPair', 'ThreeOfAKind', 'Straight',
+    'Flush', 'FullHouse', 'FourOfAKind', 'StraightFlush'
+]
+
+# A card key packs the card's rank into a base-5 digit (a rank appears at most four times) and its suit into
+# an octal digit (at most seven cards), so the key of a hand is just the sum of its card keys.
+_SUIT_BITS = 3 * NUM_SUIT
+_SUIT_MASK = (1 << _SUIT_BITS) - 1
+
+
+def card_rank(code: int) -> int:
+    return (code - 1) // NUM_SUIT
+
+
+def card_suit(code: int) -> int:
+    return (code - 1) % NUM_SUIT
+
+
+def _straight_high(mask: int) -> int:
+    for high in range(NUM_RANK - 1, 3, -1):
+        if (mask >> (high - 4)) & 0b11111 == 0b11111:
+            return high
+    if mask & 0b1000000001111 == 0b1000000001111:  # A-2-3-4-5
+        return 3
+    return -1
+
+
+_STRAIGHT_HIGH = [_straight_high(mask) for mask in range(1 << NUM_RANK)]
+
+
+def _pack(hand_type: int, ranks: List[int]) -> int:
+    value = hand_type
+    for i in range(5):
+        value = (value << 4) | (ranks[i] + 1 if i < len(ranks) else 0)
+    return value
+
+
+def _score_groups(groups: List[Tuple[int, int]]) -> int:
+    """Score a hand without a flush from its (rank, count) groups, highest rank first"""
+    present = [rank for rank, _ in groups]
+    quads = [rank for rank, count in groups if count == 4]
+    trips = [rank for rank, count in groups if count == 3]
+    pairs = [rank for rank, count in groups if count == 2]
+
+    if quads:
+        return _pack(FOUR_OF_A_KIND, [quads[0]] + [r for r in present if r != quads[0]][:1])
+    if trips and len(trips) + len(pairs) >= 2:
+        return _pack(FULL_HOUSE, [trips[0], max(trips[1:] + pairs)])
+    high = _STRAIGHT_HIGH[sum(1 << r for r in present)]
+    if high >= 0:
+        return _pack(STRAIGHT, [high])
+    if trips:
+        return _pack(THREE_OF_A_KIND, [trips[0]] + [r for r in present if r != trips[0]][:2])
+    if len(pairs) >= 2:
+        return _pack(TWO_PAIR, pairs[:2] + [r for r in present if r not in pairs[:2]][:1])
+    if pairs:
+        return _pack(PAIR, pairs[:1] + [r for r in present if r != pairs[0]][:3])
+    return _pack(HIGH_CARD, present[:5])
+
+
+def _score_flush(mask: int) -> int:
+    """Score a hand whose flush suit holds the ranks in `mask`"""
+    high = _STRAIGHT_HIGH[mask]
+    if high >= 0:
+        return _pack(STRAIGHT_FLUSH, [high])
+    return _pack(FLUSH, [r for r in range(NUM_RANK - 1, -1, -1) if mask >> r & 1][:5])
+
+
+def _rank_groups(num_card: int, rank: int, key: int, groups: List[Tuple[int, int]]):
+    """Yield the rank key and groups of every multiset of `num_card` ranks not above `rank`"""
+    if num_card == 0:
+        yield key, groups
+        return
+    for r in range(rank, -1, -1):
+        for count in range(1, min(4, num_card) + 1):
+            yield from _rank_groups(num_card - count, r - 1, key + count * 5 ** r, groups + [(r, count)])
+
+
+def _build_tables():
+    scores: Dict[int, int] = {}
+    for num_card in range(5, 8):
+        for key, groups in _rank_groups(num_card, NUM_RANK - 1, 0, []):
+            scores[key] = _score_groups(groups)
+
+    flush_scores = [0] * (1 << NUM_RANK)
+    for mask in range(1 << NUM_RANK):
+        if 5 <= bin(mask).count('1') <= 7:
+            flush_scores[mask] = _score_flush(mask)
+
+    # Collapse the packed scores to dense ranks 1..7462, higher is stronger.
+    dense = {score: i for i, score in enumerate(sorted(set(scores.values()) | set(flush_scores) - {0}), 1)}
+    rank_table = {key: dense[score] for key, score in scores.items()}
+    flush_table = [dense[score] if score else 0 for score in flush_scores]
+
+    flush_suit = [-1] * (1 << _SUIT_BITS)
+    for key in range(1 << _SUIT_BITS):
+        for suit in range(NUM_SUIT):
+            if (key >> (3 * suit)) & 7 >= 5:
+                flush_suit[key] = suit
+
+    type_first_ranks = [0] * len(HAND_TYPES)
+    for score, rank in sorted(dense.items(), reverse=True):
+        type_first_ranks[score >> 20] = rank
+    return rank_table, flush_table, flush_suit, type_first_ranks
+
+
+RANK_TABLE, FLUSH_TABLE, FLUSH_SUIT, _TYPE_FIRST_RANKS = _build_tables()
+NUM_HAND_RANK = len(set(RANK_TABLE.values()) | set(FLUSH_TABLE) - {0})
+
+CARD_KEYS = [0] + [(5 ** card_rank(code) << _SUIT_BITS) | 1 << (3 * card_suit(code))
+                   for code in range(1, len(card_codes) + 1)]
+CARD_SUITS = [-1] + [card_suit(code) for code in range(1, len(card_codes) + 1)]
+CARD_RANK_BITS = [0] + [1 << card_rank(code) for code in range(1, len(card_codes) + 1)]
+
+
+def evaluate(codes: Iterable[int]) -> int:
+    """Rank 5 to 7 cards given by card codes, a higher rank is a stronger hand"""
+    codes = tuple(codes)
+    key = 0
+    for code in codes:
+        key += CARD_KEYS[code]
+    suit = FLUSH_SUIT[key & _SUIT_MASK]
+    if suit >= 0:
+        mask = 0
+        for code in codes:
+            if CARD_SUITS[code] == suit:
+                mask |= CARD_RANK_BITS[code]
+        if FLUSH_TABLE[mask]:
+            return FLUSH_TABLE[mask]
+    return RANK_TABLE[key >> _SUIT_BITS]
+
+
+class Board:
+    """Evaluator state of the shared cards, so that each holding is folded in with a few lookups"""
+    __slots__ = ('key', 'suit_masks')
+
+    key: int
+    suit_masks: List[int]
+
+    def __init__(self, codes: Iterable[int]):
+        self.key = 0
+        self.suit_masks = [0] * NUM_SUIT
+        for code in codes:
+            self.key += CARD_KEYS[code]
+            self.suit_masks[CARD_SUITS[code]] |= CARD_RANK_BITS[code]
+
+    def evaluate(self, codes: Iterable[int]) -> int:
+        """Rank of the board together with the given cards, same as `evaluate` on all of them"""
+        codes = tuple(codes)
+        key = self.key
+        for code in codes:
+            key += CARD_KEYS[code]
+        suit = FLUSH_SUIT[key & _SUIT_MASK]
+        if suit >= 0:
+            mask = self.suit_masks[suit]
+            for code in codes:
+                if CARD_SUITS[code] == suit:
+                    mask |= CARD_RANK_BITS[code]
+            if FLUSH_TABLE[mask]:
+                return FLUSH_TABLE[mask]
+        return RANK_TABLE[key >> _SUIT_BITS]
+
+
+def hand_type(rank: int) -> str:
+    return HAND_TYPES[bisect_right(_TYPE_FIRST_RANKS, rank) - 1]
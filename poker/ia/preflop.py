@@ -0,0 +1,122 @@
+import argparse
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from poker.core import Card
+from poker.core.card import card_ranks, card_codes
+from poker.core.constants import NUM_HAND_CARD, NUM_PUBLIC_CARD
+from poker.ia.batch import HandKeys
+from poker.ia.evaluator import NUM_RANK, NUM_SUIT, card_rank
+
+NUM_HAND_CLASS = NUM_RANK * NUM_RANK
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'preflop_equity.bin')
+DEFAULT_MAX_OPPONENT = 5
+DEFAULT_NUM_SAMPLE = 200000
+SAMPLE_CHUNK_SIZE = 1 << 16
+
+# magic, version, max opponents, samples per entry; followed by a float32 (169, max opponents) equity array
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'PFEQ'
+VERSION = 1
+
+
+def hand_class(private_cards: List[Card]) -> int:
+    """Index of the starting hand in the 13x13 grid: pairs on the diagonal, suited below, offsuit above"""
+    high, low = sorted((card_rank(card.code) for card in private_cards), reverse=True)
+    if private_cards[0].suit == private_cards[1].suit:
+        return high * NUM_RANK + low
+    return low * NUM_RANK + high
+
+
+def class_name(index: int) -> str:
+    row, col = divmod(index, NUM_RANK)
+    if row == col:
+        return card_ranks[row] * 2
+    elif row > col:
+        return card_ranks[row] + card_ranks[col] + 's'
+    else:
+        return card_ranks[col] + card_ranks[row] + 'o'
+
+
+def class_cards(index: int) -> List[int]:
+    """Card codes of one representative hand of the class"""
+    row, col = divmod(index, NUM_RANK)
+    first = row * NUM_SUIT + 1
+    second = col * NUM_SUIT + (1 if row > col else 2)
+    return [first, second]
+
+
+def simulate_class(index: int, num_opponent: int, num_sample: int, seed: Optional[int] = None) -> float:
+    """Monte Carlo equity of a starting hand class against `num_opponent` random hands"""
+    rng = np.random.default_rng(seed)
+    private_cards = class_cards(index)
+    deck = np.array([code for code in card_codes.values() if code not in private_cards], dtype=np.intp)
+    num_draw = NUM_PUBLIC_CARD + NUM_HAND_CARD * num_opponent
+    private_keys = HandKeys.of(private_cards)
+
+    equity_sum = 0.
+    for start in range(0, num_sample, SAMPLE_CHUNK_SIZE):
+        size = min(SAMPLE_CHUNK_SIZE, num_sample - start)
+        drawn = deck[rng.random((size, len(deck))).argpartition(num_draw, axis=1)[:, :num_draw]]
+        boards = HandKeys.of(drawn[:, :NUM_PUBLIC_CARD])
+        private_ranks = (boards + private_keys).rank()
+        opponent_ranks = (boards[:, None] + HandKeys.of(drawn[:, NUM_PUBLIC_CARD:].reshape(size, num_opponent, -1))).rank()
+        best = opponent_ranks.max(axis=1)
+        num_tie = (opponent_ranks == private_ranks[:, None]).sum(axis=1)
+        equity_sum += float((private_ranks > best).sum() + ((private_ranks == best) / (1 + num_tie)).sum())
+    return equity_sum / num_sample
+
+
+def build_table(max_opponent: int = DEFAULT_MAX_OPPONENT, num_sample: int = DEFAULT_NUM_SAMPLE,
+                num_worker: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    jobs = [(index, num_opponent) for index in range(NUM_HAND_CLASS) for num_opponent in range(1, max_opponent + 1)]
+    with ProcessPoolExecutor(num_worker or os.cpu_count()) as executor:
+        futures = [executor.submit(simulate_class, index, num_opponent, num_sample, seed + i)
+                   for i, (index, num_opponent) in enumerate(jobs)]
+        table = np.zeros((NUM_HAND_CLASS, max_opponent), dtype=np.float32)
+        for (index, num_opponent), future in zip(jobs, futures):
+            table[index, num_opponent - 1] = future.result()
+    return table
+
+
+def write_table(path: str, table: np.ndarray, num_sample: int):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, table.shape[1], num_sample))
+        f.write(np.ascontiguousarray(table, dtype='<f4').tobytes())
+
+
+class PreflopTable:
+    max_opponent: int
+    num_sample: int
+    table: np.ndarray
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            magic, version, self.max_opponent, self.num_sample = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a preflop equity table.')
+        self.table = np.memmap(path, dtype='<f4', mode='r', offset=HEADER.size,
+                               shape=(NUM_HAND_CLASS, self.max_opponent))
+
+    def equity(self, private_cards: List[Card], num_opponent: int = 1) -> float:
+        if not 1 <= num_opponent <= self.max_opponent:
+            raise ValueError(f'Table covers 1 to {self.max_opponent} opponents, got {num_opponent}.')
+        return float(self.table[hand_class(private_cards), num_opponent - 1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the preflop equity table of the 169 starting hands.')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH)
+    parser.add_argument('-n', '--max-opponent', type=int, default=DEFAULT_MAX_OPPONENT)
+    parser.add_argument('-s', '--num-sample', type=int, default=DEFAULT_NUM_SAMPLE)
+    parser.add_argument('-w', '--num-worker', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_table(args.output, build_table(args.max_opponent, args.num_sample, args.num_worker, args.seed), args.num_sample)
+    print(f'Wrote {args.output}')
@@ -0,0 +1,144 @@
+import argparse
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import combinations, permutations
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from poker.core import Card
+from poker.core.card import card_codes
+from poker.core.constants import NUM_HAND_CARD, NUM_PUBLIC_CARD
+from poker.core.isomorphism import hand_indexer
+from poker.ia.batch import HandKeys
+from poker.ia.evaluator import NUM_SUIT
+from poker.ia.ranges import COMBO_INDEX, NUM_COMBO, Range
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'preflop_matrix.bin')
+JOB_SIZE = 64
+
+# magic, version, bytes per entry, boards per matchup (0 when every board is enumerated);
+# followed by a (1326, 1326) equity array of the row combo against the column combo, NaN where they share a card
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'HUEQ'
+VERSION = 1
+DTYPES = {2: '<f2', 4: '<f4'}
+
+
+@lru_cache(maxsize=None)
+def _all_boards() -> Tuple[np.ndarray, HandKeys]:
+    """Card masks and keys of the 2598960 five-card boards"""
+    boards = np.array(list(combinations(range(1, len(card_codes) + 1), NUM_PUBLIC_CARD)), dtype=np.intp)
+    return (np.int64(1) << (boards - 1)).sum(axis=1), HandKeys.of(boards)
+
+
+def matchup_equity(private_cards: List[int], opponent_cards: List[int], num_board: Optional[int] = None,
+                   seed: Optional[int] = None) -> float:
+    """Equity of one holding against another, over every board or over `num_board` random ones"""
+    masks, keys = _all_boards()
+    dead = sum(1 << (code - 1) for code in private_cards + opponent_cards)
+    boards = np.nonzero((masks & dead) == 0)[0]
+    if num_board is not None:
+        boards = np.random.default_rng(seed).choice(boards, min(num_board, len(boards)), replace=False)
+    board_keys = keys[boards]
+    private_ranks = (board_keys + HandKeys.of(private_cards)).rank()
+    opponent_ranks = (board_keys + HandKeys.of(opponent_cards)).rank()
+    num_win = np.count_nonzero(private_ranks > opponent_ranks)
+    num_tie = np.count_nonzero(private_ranks == opponent_ranks)
+    return (num_win + num_tie / 2) / len(boards)
+
+
+def _solve(matchups: List[List[List[int]]], num_board: Optional[int], seed: int) -> List[float]:
+    return [matchup_equity(*matchup, num_board, seed + i) for i, matchup in enumerate(matchups)]
+
+
+def build_matrix(num_board: Optional[int] = None, num_worker: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    """
+    Equity of every combo against every other. Only one matchup per suit-isomorphism class is solved, and only one
+    of each matchup and its mirror, which leaves about 47k of the 1.7M ordered pairs.
+    """
+    indexer = hand_indexer((NUM_HAND_CARD, NUM_HAND_CARD))
+    matchups = [indexer.unindex(index) for index in range(indexer.size)]
+    mirrors = np.array([indexer.index(matchup[::-1]) for matchup in matchups])
+    solved = np.nonzero(np.arange(indexer.size) < mirrors)[0]
+
+    # A matchup that is its own mirror is an even split.
+    equities = np.full(indexer.size, .5)
+    jobs = [solved[start:start + JOB_SIZE] for start in range(0, len(solved), JOB_SIZE)]
+    with ProcessPoolExecutor(num_worker or os.cpu_count()) as executor:
+        futures = [executor.submit(_solve, [matchups[index] for index in job], num_board, seed + int(job[0]))
+                   for job in jobs]
+        for job, future in zip(jobs, futures):
+            equities[job] = future.result()
+    mirrored = np.arange(indexer.size) > mirrors
+    equities[mirrored] = 1 - equities[mirrors[mirrored]]
+
+    # Every ordered pair is a representative with its suits relabelled.
+    cards = np.array([private_cards + opponent_cards for private_cards, opponent_cards in matchups], dtype=np.intp)
+    matrix = np.full((NUM_COMBO, NUM_COMBO), np.nan, dtype=np.float32)
+    for suits in permutations(range(NUM_SUIT)):
+        relabel = np.array([0] + [code - (code - 1) % NUM_SUIT + suits[(code - 1) % NUM_SUIT]
+                                  for code in range(1, len(card_codes) + 1)])
+        codes = relabel[cards]
+        matrix[COMBO_INDEX[codes[:, 0], codes[:, 1]], COMBO_INDEX[codes[:, 2], codes[:, 3]]] = equities
+    return matrix
+
+
+def write_matrix(path: str, matrix: np.ndarray, num_board: Optional[int], itemsize: int = 2):
+    if itemsize not in DTYPES:
+        raise ValueError(f'Entries are 2 or 4 bytes, got {itemsize}.')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, itemsize, num_board or 0))
+        f.write(np.ascontiguousarray(matrix, dtype=DTYPES[itemsize]).tobytes())
+
+
+class PreflopMatrix:
+    """
+    Heads-up preflop equity of every combo against every other, memory-mapped read-only so that all processes
+    on a machine share the pages of one file
+    """
+    num_board: Optional[int]
+    matrix: np.ndarray
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            magic, version, itemsize, num_board = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or itemsize not in DTYPES:
+            raise ValueError(f'{path} is not a preflop equity matrix.')
+        self.num_board = num_board or None
+        self.matrix = np.memmap(path, dtype=DTYPES[itemsize], mode='r', offset=HEADER.size,
+                                shape=(NUM_COMBO, NUM_COMBO))
+
+    def equity(self, private_cards: List[Card], opponent_cards: List[Card]) -> float:
+        i = COMBO_INDEX[private_cards[0].code, private_cards[1].code]
+        j = COMBO_INDEX[opponent_cards[0].code, opponent_cards[1].code]
+        if i == j or {card.code for card in private_cards} & {card.code for card in opponent_cards}:
+            raise ValueError('Duplicate cards.')
+        return float(self.matrix[i, j])
+
+    def range_equity(self, hero: Range, villain: Range) -> float:
+        """Equity of a range against another, weighting each pair of combos that can be dealt together"""
+        matrix = np.asarray(self.matrix, dtype=np.float64)
+        valid = ~np.isnan(matrix)
+        pair_weights = np.outer(hero.weights, villain.weights) * valid
+        total = pair_weights.sum()
+        if not total:
+            raise ValueError('No hero combo can face a villain combo.')
+        return float((pair_weights * np.where(valid, matrix, 0.)).sum() / total)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the heads-up preflop equity matrix of the 1326 combos.')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH)
+    parser.add_argument('-b', '--num-board', type=int, default=None,
+                        help='random boards per matchup, every board is enumerated by default')
+    parser.add_argument('-i', '--itemsize', type=int, choices=sorted(DTYPES), default=2)
+    parser.add_argument('-w', '--num-worker', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_matrix(args.output, build_matrix(args.num_board, args.num_worker, args.seed), args.num_board, args.itemsize)
+    print(f'Wrote {args.output}')
@@ -0,0 +1,240 @@
+import re
+from itertools import combinations
+from typing import List, Optional
+
+import numpy as np
+
+from poker.core import Card, CardSet
+from poker.core.card import card_ranks, card_suits, card_codes
+from poker.core.constants import NUM_PUBLIC_CARD
+from poker.ia.batch import HandKeys
+
+NUM_COMBO = 1326
+DEFAULT_NUM_BOARD = 2000
+BOARD_CHUNK_SIZE = 32
+
+COMBOS = np.array(list(combinations(range(1, len(card_codes) + 1), 2)), dtype=np.intp)
+COMBO_INDEX = np.full((len(card_codes) + 1,) * 2, -1, dtype=np.intp)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(NUM_COMBO)
+COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(NUM_COMBO)
+COMBO_MASKS = (np.int64(1) << (COMBOS[:, 0] - 1)) | (np.int64(1) << (COMBOS[:, 1] - 1))
+# The 51 combos holding each card, indexed by card code.
+CARD_COMBOS = np.array([[0] * 51] + [np.nonzero((COMBOS == code).any(axis=1))[0] for code in range(1, len(card_codes) + 1)],
+                       dtype=np.intp)
+COMBO_KEYS = HandKeys.of(COMBOS)
+# Where each combo sits among the combos of its first and of its second card, as (card index, position) arrays.
+COMBO_CARD_POSITIONS = [(COMBOS[:, i] - 1, np.argmax(CARD_COMBOS[COMBOS[:, i]] == np.arange(NUM_COMBO)[:, None], axis=1))
+                        for i in range(2)]
+
+_TOKEN = re.compile(r'^([2-9TJQKA])([2-9TJQKA])([so]?)(\+?)(?:-([2-9TJQKA])([2-9TJQKA])([so]?))?$')
+
+
+def _rank_combos(high: int, low: int, kind: str) -> List[int]:
+    """Combo indices of a starting hand given by rank indices, `kind` is 's', 'o' or '' for both"""
+    codes = [[rank * len(card_suits) + suit + 1 for suit in range(len(card_suits))] for rank in (high, low)]
+    if high == low:
+        return [int(COMBO_INDEX[a, b]) for a, b in combinations(codes[0], 2)]
+    return [int(COMBO_INDEX[a, b]) for i, a in enumerate(codes[0]) for j, b in enumerate(codes[1])
+            if kind == '' or (kind == 's') == (i == j)]
+
+
+class Range:
+    """Weights of the 1326 hole-card combos, in the order of `COMBOS`"""
+    weights: np.ndarray
+
+    def __init__(self, weights: Optional[np.ndarray] = None):
+        self.weights = np.zeros(NUM_COMBO) if weights is None else np.asarray(weights, dtype=float)
+
+    @classmethod
+    def full(cls) -> 'Range':
+        return cls(np.ones(NUM_COMBO))
+
+    @classmethod
+    def of_cards(cls, cards: List[Card]) -> 'Range':
+        inst = cls()
+        inst.weights[COMBO_INDEX[cards[0].code, cards[1].code]] = 1.
+        return inst
+
+    @classmethod
+    def parse(cls, text: str) -> 'Range':
+        """Parse notation like "TT+, AKs, KQo, A5s-A2s, AhKh, QQ:0.5", later entries override earlier ones"""
+        inst = cls()
+        for token in filter(None, (token.strip() for token in text.split(','))):
+            token, _, weight = token.partition(':')
+            for index in cls._parse_token(token.strip()):
+                inst.weights[index] = float(weight) if weight else 1.
+        return inst
+
+    @staticmethod
+    def _parse_token(token: str) -> List[int]:
+        if len(token) == 4 and token[1] in card_suits and token[3] in card_suits:
+            first, second = Card.from_rank_suit(token[:2]), Card.from_rank_suit(token[2:])
+            if first == second:
+                raise ValueError(f'Invalid combo: {token}')
+            return [int(COMBO_INDEX[first.code, second.code])]
+
+        match = _TOKEN.match(token)
+        if not match:
+            raise ValueError(f'Invalid range: {token}')
+        first, second, kind, plus, last_first, last_second, last_kind = match.groups()
+        high, low = sorted((card_ranks.index(first), card_ranks.index(second)), reverse=True)
+        if high == low and kind:
+            raise ValueError(f'Invalid range: {token}')
+
+        if last_first:
+            last_high, last_low = sorted((card_ranks.index(last_first), card_ranks.index(last_second)), reverse=True)
+            if last_kind != kind or (high == low) != (last_high == last_low) or (high != low and last_high != high):
+                raise ValueError(f'Invalid range: {token}')
+            if high == low:
+                hands = [(rank, rank) for rank in range(min(high, last_high), max(high, last_high) + 1)]
+            else:
+                hands = [(high, rank) for rank in range(min(low, last_low), max(low, last_low) + 1)]
+        elif plus:
+            if high == low:
+                hands = [(rank, rank) for rank in range(high, len(card_ranks))]
+            else:
+                hands = [(high, rank) for rank in range(low, high)]
+        else:
+            hands = [(high, low)]
+        return [index for hand in hands for index in _rank_combos(*hand, kind)]
+
+    def remove(self, dead: CardSet) -> 'Range':
+        """Copy of the range without the combos blocked by `dead`"""
+        return Range(np.where(COMBO_MASKS & dead.mask, 0., self.weights))
+
+    @property
+    def num_combo(self) -> float:
+        return float(self.weights.sum())
+
+    def combos(self) -> List[List[Card]]:
+        return [[Card.from_code(code) for code in COMBOS[index]] for index in np.nonzero(self.weights)[0]]
+
+    def __repr__(self):
+        return f'Range({self.num_combo:g} combos)'
+
+
+class RangeEquity:
+    win: float
+    tie: float
+    combo_equity: np.ndarray
+
+    def __init__(self, win: float, tie: float, combo_equity: np.ndarray):
+        self.win = win
+        self.tie = tie
+        self.combo_equity = combo_equity
+
+    @property
+    def equity(self) -> float:
+        return self.win + self.tie / 2
+
+    def json(self) -> dict:
+        return {'win': self.win, 'tie': self.tie, 'equity': self.equity}
+
+
+def _below_upto(ranks: np.ndarray, weights: np.ndarray):
+    """Weight strictly below and at or below each element's rank, along the last axis"""
+    order = np.argsort(ranks, axis=-1)
+    sorted_ranks = np.take_along_axis(ranks, order, axis=-1)
+    upto = np.cumsum(np.take_along_axis(weights, order, axis=-1), axis=-1)
+    below = upto - np.take_along_axis(weights, order, axis=-1)
+
+    # Ties share the weight below their first and up to their last element.
+    positions = np.arange(ranks.shape[-1])
+    first = sorted_ranks != np.roll(sorted_ranks, 1, axis=-1)
+    first[..., 0] = True
+    last = np.roll(first, -1, axis=-1)
+    last[..., -1] = True
+    first_positions = np.maximum.accumulate(np.where(first, positions, 0), axis=-1)
+    last_positions = np.flip(np.minimum.accumulate(np.flip(np.where(last, positions, positions[-1]), -1), -1), -1)
+
+    result_below = np.empty_like(below)
+    result_upto = np.empty_like(upto)
+    np.put_along_axis(result_below, order, np.take_along_axis(below, first_positions, axis=-1), axis=-1)
+    np.put_along_axis(result_upto, order, np.take_along_axis(upto, last_positions, axis=-1), axis=-1)
+    return result_below, result_upto
+
+
+def _board_totals(villain: np.ndarray, boards: np.ndarray):
+    """Villain weight beaten by, tied with and disjoint from each hero combo, summed over full boards"""
+    board_masks = (np.int64(1) << (boards - 1)).sum(axis=1)
+    live = (COMBO_MASKS & board_masks[:, None]) == 0
+    combos = np.where(live, np.arange(NUM_COMBO), np.argmax(live, axis=1)[:, None])
+    ranks = (COMBO_KEYS[combos] + HandKeys.of(boards)[:, None]).rank()
+    villain = villain * live
+    below, upto = _below_upto(ranks, villain)
+    total = villain.sum(axis=1, keepdims=True)
+
+    # Take out the villain combos sharing a card with the hero combo. Those are the hero combos holding the same
+    # card, so they are compared within each card's 51 combos; the combo itself is shared by both of its cards.
+    card_weights = villain[:, CARD_COMBOS[1:]]
+    card_below, card_upto = _below_upto(ranks[:, CARD_COMBOS[1:]], card_weights)
+    card_total = card_weights.sum(axis=2)
+    for cards, positions in COMBO_CARD_POSITIONS:
+        below = below - card_below[:, cards, positions]
+        upto = upto - card_upto[:, cards, positions]
+        total = total - card_total[:, cards]
+    upto += villain
+    total += villain
+    return (below * live).sum(axis=0), ((upto - below) * live).sum(axis=0), (total * live).sum(axis=0)
+
+
+def range_equity(hero: Range, villain: Range, public_cards: List[Card],
+                 num_board: int = DEFAULT_NUM_BOARD, seed: Optional[int] = None) -> RangeEquity:
+    """
+    Equity of a hero range against a villain range, every remaining runout is enumerated from the flop on
+    while `num_board` random boards are sampled preflop
+    """
+    public = np.array([card.code for card in public_cards], dtype=np.intp)
+    dead = CardSet.from_codes(public.tolist())
+    hero_weights = hero.remove(dead).weights
+    villain_weights = villain.remove(dead).weights
+    deck = np.array([code for code in card_codes.values() if code not in public], dtype=np.intp)
+    num_runout = NUM_PUBLIC_CARD - len(public)
+
+    if len(public) >= 3:
+        runouts = list(combinations(deck, num_runout))
+        runouts = np.array(runouts, dtype=np.intp).reshape(len(runouts), num_runout)
+    else:
+        rng = np.random.default_rng(seed)
+        runouts = deck[rng.random((num_board, len(deck))).argpartition(num_runout, axis=1)[:, :num_runout]]
+
+    win = np.zeros(NUM_COMBO)
+    tie = np.zeros(NUM_COMBO)
+    total = np.zeros(NUM_COMBO)
+    for start in range(0, len(runouts), BOARD_CHUNK_SIZE):
+        chunk = runouts[start:start + BOARD_CHUNK_SIZE]
+        boards = np.concatenate([np.broadcast_to(public, (len(chunk), len(public))), chunk], axis=1)
+        board_win, board_tie, board_total = _board_totals(villain_weights, boards)
+        win += board_win
+        tie += board_tie
+        total += board_total
+
+    weight = (hero_weights * total).sum()
+    if not weight:
+        raise ValueError('No hero combo can face a villain combo.')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        combo_equity = np.where(hero_weights * total > 0, (win + tie / 2) / total, np.nan)
+    return RangeEquity(float((hero_weights * win).sum() / weight), float((hero_weights * tie).sum() / weight),
+                       combo_equity)
+
+
+def hand_equity(private_cards: List[Card], villain: Range, public_cards: List[Card],
+                num_board: int = DEFAULT_NUM_BOARD, seed: Optional[int] = None) -> RangeEquity:
+    return range_equity(Range.of_cards(private_cards), villain, public_cards, num_board, seed)
+
+
+if __name__ == '__main__':
+    import time
+
+    from poker.ia.equity import exact_equity
+
+    hand = [Card.from_rank_suit('Ah'), Card.from_rank_suit('Ad')]
+    board = [Card.from_rank_suit(card) for card in ('Kc', '7h', '2s')]
+    start = time.perf_counter()
+    result = hand_equity(hand, Range.full(), board)
+    print(f'AhAd vs any two on Kc7h2s: {result.json()} in {time.perf_counter() - start:.2f}s')
+    assert abs(result.equity - exact_equity(hand, board).equity) < 1e-9
+
+    start = time.perf_counter()
+    result = range_equity(Range.parse('TT+, AKs'), Range.parse('22+, A2s+, KQo, QJs:0.5'), board)
+    print(f'TT+,AKs vs 22+,A2s+,KQo,QJs:0.5 on Kc7h2s: {result.json()} in {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,219 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from poker.core.card import card_codes
+from poker.core.constants import INIT_STACK, SMALL_BLIND, BIG_BLIND, NUM_HAND_CARD, NUM_PUBLIC_CARD
+from poker.ia.action import IaActionType
+from poker.ia.batch import evaluate_batch
+
+NUM_PLAYER = 2
+NUM_STAGE = 4
+MAX_RAISE = 4
+# Columns of the legal action mask, an action type `t` is column `t - 1`
+ACTION_TYPES = [IaActionType.FOLD, IaActionType.CHECK, IaActionType.CALL, IaActionType.RAISE]
+# Public cards shown in each stage
+NUM_STAGE_CARD = np.array([0, 3, 4, 5])
+
+
+class VectorEnv:
+    """
+    Independent heads-up hands with the rules of `Env`, stepped together on NumPy arrays.
+    Every call to `step` takes one action in each hand, finished hands are paid out and dealt again at once.
+    """
+    num_env: int
+    rng: np.random.Generator
+    private_cards: np.ndarray
+    public_cards: np.ndarray
+    contribution: np.ndarray
+    stage_contribution: np.ndarray
+    folded: np.ndarray
+    stage: np.ndarray
+    position: np.ndarray
+    min_raise_by: np.ndarray
+    max_contribution: np.ndarray
+    num_raise: np.ndarray
+    num_hand: int
+
+    def __init__(self, num_env: int, seed: Optional[int] = None):
+        self.num_env = num_env
+        self.rng = np.random.default_rng(seed)
+        self.private_cards = np.zeros((num_env, NUM_PLAYER, NUM_HAND_CARD), dtype=np.intp)
+        self.public_cards = np.zeros((num_env, NUM_PUBLIC_CARD), dtype=np.intp)
+        self.contribution = np.zeros((num_env, NUM_PLAYER), dtype=np.int64)
+        self.stage_contribution = np.zeros((num_env, NUM_PLAYER), dtype=np.int64)
+        self.folded = np.zeros((num_env, NUM_PLAYER), dtype=bool)
+        self.stage = np.zeros(num_env, dtype=np.int64)
+        self.position = np.zeros(num_env, dtype=np.int64)
+        self.min_raise_by = np.zeros(num_env, dtype=np.int64)
+        self.max_contribution = np.zeros(num_env, dtype=np.int64)
+        self.num_raise = np.zeros(num_env, dtype=np.int64)
+        self.num_hand = 0
+
+    def reset(self, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Deal new hands in the given rows, all by default, and post the blinds"""
+        rows = np.arange(self.num_env) if rows is None else rows
+        num_draw = NUM_PLAYER * NUM_HAND_CARD + NUM_PUBLIC_CARD
+        drawn = self.rng.random((len(rows), len(card_codes))).argpartition(num_draw, axis=1)[:, :num_draw] + 1
+        self.private_cards[rows] = drawn[:, :NUM_PLAYER * NUM_HAND_CARD].reshape(-1, NUM_PLAYER, NUM_HAND_CARD)
+        self.public_cards[rows] = drawn[:, NUM_PLAYER * NUM_HAND_CARD:]
+        self.contribution[rows] = (SMALL_BLIND, BIG_BLIND)
+        self.stage_contribution[rows] = (SMALL_BLIND, BIG_BLIND)
+        self.folded[rows] = False
+        self.stage[rows] = 0
+        self.position[rows] = 0
+        self.min_raise_by[rows] = 0
+        self.max_contribution[rows] = BIG_BLIND
+        self.num_raise[rows] = 0
+        self.num_hand += len(rows)
+        return self.observe()
+
+    def legal_actions(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Mask of legal actions in the columns of `ACTION_TYPES`, and the (min, max) raise-to amounts"""
+        rows = np.arange(self.num_env)
+        behind = self.stage_contribution[rows, self.position] < self.max_contribution
+        can_raise = self.num_raise < MAX_RAISE
+        mask = np.stack([np.ones(self.num_env, dtype=bool), ~behind, behind, can_raise], axis=1)
+
+        max_raise_to = self.stage_contribution[rows, self.position] + INIT_STACK - self.contribution[rows, self.position]
+        min_raise_to = np.minimum(np.maximum(BIG_BLIND, self.max_contribution + self.min_raise_by), max_raise_to)
+        raise_range = np.where(can_raise[:, None], np.stack([min_raise_to, max_raise_to], axis=1), 0)
+        return mask, raise_range
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        """What the player to act sees in each hand, public cards not shown yet are 0"""
+        rows = np.arange(self.num_env)
+        legal_actions, raise_range = self.legal_actions()
+        shown = np.arange(NUM_PUBLIC_CARD) < NUM_STAGE_CARD[self.stage][:, None]
+        return {
+            'position': self.position.copy(),
+            'stage': self.stage.copy(),
+            'private_cards': self.private_cards[rows, self.position],
+            'public_cards': np.where(shown, self.public_cards, 0),
+            'contribution': self.contribution.copy(),
+            'stage_contribution': self.stage_contribution.copy(),
+            'legal_actions': legal_actions,
+            'raise_range': raise_range
+        }
+
+    def step(self, action_types: np.ndarray, raise_to: Optional[np.ndarray] = None
+             ) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        """
+        Take one action in every hand, `action_types` holds `IaActionType` values and `raise_to` the amounts of raises.
+        Returns the observations after finished hands are dealt again, the chips won by each player in hands that
+        finished and which hands finished.
+        """
+        rows = np.arange(self.num_env)
+        action_types = np.asarray(action_types)
+        raise_to = np.zeros(self.num_env, dtype=np.int64) if raise_to is None else np.asarray(raise_to)
+        legal_actions, raise_range = self.legal_actions()
+        if ((action_types < IaActionType.FOLD) | (action_types > IaActionType.RAISE)).any():
+            raise ValueError('Invalid action type.')
+        if not legal_actions[rows, action_types - 1].all():
+            raise ValueError('Illegal action.')
+        raising = action_types == IaActionType.RAISE
+        if ((raising & ((raise_to < raise_range[:, 0]) | (raise_to > raise_range[:, 1])))).any():
+            raise ValueError('Raise amount out of range.')
+
+        position = self.position
+        stage_contribution = self.stage_contribution[rows, position]
+        amount = np.where(action_types == IaActionType.CALL, self.max_contribution - stage_contribution, 0)
+        amount = np.where(raising, raise_to - stage_contribution, amount)
+        self.min_raise_by = np.where(raising, raise_to - self.max_contribution, self.min_raise_by)
+        self.max_contribution = np.where(raising, raise_to, self.max_contribution)
+        self.num_raise += raising
+        self.stage_contribution[rows, position] += amount
+        self.contribution[rows, position] += amount
+        self.folded[rows, position] |= action_types == IaActionType.FOLD
+        self.position = 1 - position
+
+        matched = self.stage_contribution[:, 0] == self.stage_contribution[:, 1]
+        done = self.folded.any(axis=1) | ((self.stage == NUM_STAGE - 1) & matched)
+        next_stage = ~done & matched
+        self.stage += next_stage
+        self.position[next_stage] = 1
+        self.stage_contribution[next_stage] = 0
+        self.min_raise_by[next_stage] = 0
+        self.max_contribution[next_stage] = 0
+        self.num_raise[next_stage] = 0
+        # As in `Env`, nobody owes anything when the last stage starts, so the hand is over right away.
+        done |= next_stage & (self.stage == NUM_STAGE - 1)
+
+        rewards = np.zeros((self.num_env, NUM_PLAYER))
+        finished = np.nonzero(done)[0]
+        if len(finished):
+            rewards[finished] = self._settle(finished)
+            self.reset(finished)
+        return self.observe(), rewards, done
+
+    def _settle(self, rows: np.ndarray) -> np.ndarray:
+        """Chips won by each player in finished hands, as `Env.win_chip`"""
+        folded = self.folded[rows]
+        contribution = self.contribution[rows]
+        showdown = ~folded.any(axis=1)
+        won = ~folded
+        if showdown.any():
+            hands = np.concatenate([self.private_cards[rows[showdown]],
+                                    np.repeat(self.public_cards[rows[showdown], None], NUM_PLAYER, axis=1)], axis=2)
+            ranks = evaluate_batch(hands)
+            won[showdown] = ranks == ranks.max(axis=1, keepdims=True)
+        lost_chip = np.where(won, 0, contribution).sum(axis=1, keepdims=True)
+        return np.where(won, lost_chip / won.sum(axis=1, keepdims=True), -contribution)
+
+
+if __name__ == '__main__':
+    import time
+
+    from poker.core import Card
+    from poker.ia.action import IaFold, IaCheck, IaCall, IaRaise
+    from poker.ia.env import Env
+
+    simple_actions = {IaActionType.FOLD: IaFold(), IaActionType.CHECK: IaCheck(), IaActionType.CALL: IaCall()}
+
+    def random_actions(rng: np.random.Generator, observation: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        scores = rng.random(observation['legal_actions'].shape) * observation['legal_actions']
+        low, high = observation['raise_range'].T
+        raise_to = low + (rng.random(len(low)) * (np.minimum(high, low * 3) - low + 1)).astype(np.int64)
+        return scores.argmax(axis=1) + 1, raise_to
+
+    def deal(env: Env, vector_env: VectorEnv, i: int):
+        """Give a hand of `Env` the cards of one row of `vector_env`"""
+        env.reset()
+        env.private_cards = [tuple(Card.from_code(code) for code in hand) for hand in vector_env.private_cards[i]]
+        env.public_card_all = tuple(Card.from_code(code) for code in vector_env.public_cards[i])
+
+    # Play the same cards and actions in `Env` and compare every decision and payout.
+    generator = np.random.default_rng(1)
+    vector_env = VectorEnv(256, seed=0)
+    observation = vector_env.reset()
+    envs = [Env(['player0', 'player1']) for _ in range(vector_env.num_env)]
+    for i, env in enumerate(envs):
+        deal(env, vector_env, i)
+    for _ in range(200):
+        action_types, raise_to = random_actions(generator, observation)
+        for i, env in enumerate(envs):
+            legal_actions, raise_range = env._get_legal_actions()
+            assert [action_type in legal_actions for action_type in ACTION_TYPES] == \
+                observation['legal_actions'][i].tolist()
+            assert (raise_range or (0, 0)) == tuple(observation['raise_range'][i])
+            action_type = IaActionType(int(action_types[i]))
+            env.new_action(IaRaise(int(raise_to[i])) if action_type == IaActionType.RAISE
+                           else simple_actions[action_type])
+            if not env.is_over() and env.is_stage_over():
+                env.new_stage()
+        observation, rewards, done = vector_env.step(action_types, raise_to)
+        for i, env in enumerate(envs):
+            assert env.is_over() == done[i]
+            if done[i]:
+                assert env.win_chip == rewards[i].tolist()
+                deal(env, vector_env, i)
+
+    vector_env = VectorEnv(4096, seed=0)
+    observation = vector_env.reset()
+    start = time.perf_counter()
+    num_hand = vector_env.num_hand
+    for _ in range(500):
+        observation, rewards, done = vector_env.step(*random_actions(generator, observation))
+    elapsed = time.perf_counter() - start
+    print(f'VectorEnv({vector_env.num_env}): {vector_env.num_env * 500 / elapsed:12,.0f} steps/s, '
+          f'{(vector_env.num_hand - num_hand) / elapsed:12,.0f} hands/s')
@@ -1,5 +1,21 @@
+import argparse
+import logging
+
 from poker.host.host import Host
+from poker.host.workers import WorkerHost
 
 if __name__ == '__main__':
-    host = Host(('127.0.0.1', 2333))
+    parser = argparse.ArgumentParser(description='Run the game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=2333)
+    parser.add_argument('-w', '--num-worker', type=int, default=0,
+                        help='worker processes playing the games, 0 to play them in this process')
+    parser.add_argument('--history', default=None, help='append every hand to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.num_worker:
+        host = WorkerHost((args.host, args.port), args.num_worker, history_path=args.history)
+    else:
+        host = Host((args.host, args.port), history_path=args.history)
     host.run()